@@ -0,0 +1,128 @@
+"""
+Compares the time of the chronograph tick that ends a bids stage and starts the next pause
+(publishing the bid, updating results and setting the order of the next round)
+as it was done before, with the bidder labels found by scanning initial_bids and the bids sorted
+by their parsed amounts for every use, against the bidder index, the saved sort keys
+and the sorted bids reused during the tick.
+
+Every tick is timed on its own copy of the auction built in advance,
+the fastest of the runs is printed.
+
+Usage: PYTHONPATH=src python benchmarks/chronograph_bidders.py
+"""
+from prozorro_auction.chronograph.model import sort_bids, get_label_dict, copy_bid_stage_fields, is_esco_bids
+from prozorro_auction.chronograph.stages import on_end_stage_bids, on_start_stage_pause
+from prozorro_auction.utils.ranking import calculate_bid_sort_key
+from prozorro_auction.utils.base import get_now
+from datetime import datetime, timedelta
+from copy import deepcopy
+from time import perf_counter
+import asyncio
+
+BIDDERS = (2, 5, 10, 50, 100, 200, 500)
+REPEATS = 50
+
+
+def build_auction(bidders):
+    date = datetime(2021, 1, 1)
+    bids = [
+        {
+            "id": f"{n:032x}",
+            "date": date + timedelta(seconds=n),
+            "value": {"amount": 1000 + n * 7 % bidders},
+        }
+        for n in range(bidders)
+    ]
+    for bid in bids:  # saved by the databridge
+        bid["sort_key"] = calculate_bid_sort_key(bid, "default")
+    initial_bids = []
+    for n, bid in enumerate(sort_bids(bids)):
+        initial_bid = dict(label=get_label_dict(n))
+        copy_bid_stage_fields(bid, initial_bid)
+        initial_bids.append(initial_bid)
+
+    stages = [{"type": "pause", "start": date}]
+    stages.extend({"type": "bids", "start": date, "bidder_id": b["bidder_id"]} for b in initial_bids)
+    stages.append({"type": "pause", "start": date})
+    stages.extend({"type": "bids", "start": date} for _ in bids)
+    current_stage = len(bids)
+    bids[0]["stages"] = {str(current_stage): {"amount": 1, "time": date}}
+    stages[current_stage]["bidder_id"] = bids[0]["id"]
+    return {
+        "_id": "1" * 32,
+        "auction_type": "default",
+        "current_stage": current_stage,
+        "bids": bids,
+        "initial_bids": initial_bids,
+        "stages": stages,
+    }
+
+
+# the tick as it was done before, for the default auctions only
+
+def linear_sort_bids(bids):
+    is_esco = is_esco_bids(bids)
+    return sorted(bids, key=lambda b: (b["value"]["amount"], b["date"]), reverse=not is_esco)
+
+
+def get_bidder_number(uid, initial_bids):
+    for n, bid in enumerate(initial_bids):
+        if bid["bidder_id"] == uid:
+            return n
+
+
+def linear_publish_bid(auction):
+    current_stage = auction["current_stage"]
+    stage = auction["stages"][current_stage]
+    stage["publish_time"] = get_now()
+    for bid in auction["bids"]:
+        if bid["id"] == stage["bidder_id"]:
+            bid_stage_items = bid["stages"][str(current_stage)]
+            bid["date"] = bid_stage_items.pop("time")
+            bid["value"].update(bid_stage_items)
+            copy_bid_stage_fields(bid, stage)
+            stage["changed"] = True
+            break
+
+
+async def linear_tick(auction):
+    linear_publish_bid(auction)
+    auction["results"] = []
+    for bid in linear_sort_bids(auction["bids"]):
+        result = {"label": get_label_dict(get_bidder_number(bid["id"], auction["initial_bids"]))}
+        copy_bid_stage_fields(bid, result)
+        auction["results"].append(result)
+
+    index = auction["current_stage"] + 2
+    for i, bid in enumerate(linear_sort_bids(auction["bids"])):
+        bid_stage = dict(label=get_label_dict(get_bidder_number(bid["id"], auction["initial_bids"])))
+        copy_bid_stage_fields(bid, bid_stage)
+        auction["stages"][index + i].update(bid_stage)
+
+
+async def indexed_tick(auction):
+    await on_end_stage_bids(auction)
+    await on_start_stage_pause(auction)
+
+
+async def measure(tick, auction):
+    copies = [deepcopy(auction) for _ in range(REPEATS)]
+    times = []
+    for auction_copy in copies:
+        started = perf_counter()
+        await tick(auction_copy)
+        times.append(perf_counter() - started)
+    return min(times)
+
+
+async def main():
+    print(f"{'bidders':>8} {'linear, ms':>12} {'indexed, ms':>12}")
+    for bidders in BIDDERS:
+        auction = build_auction(bidders)
+        linear = await measure(linear_tick, auction)
+        indexed = await measure(indexed_tick, auction)
+        print(f"{bidders:>8} {linear * 1000:>12.3f} {indexed * 1000:>12.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
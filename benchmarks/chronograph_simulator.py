@@ -0,0 +1,373 @@
+"""
+Runs chronograph_loop over synthetic auctions to measure how many of them one chronograph handles.
+
+The auctions are built by databridge.model.build_stages and saved to a local mongodb database,
+their bidders have posted bids for every round in advance.
+Tenders api and document service requests go to a fake http server started by the simulator.
+The clock of the chronograph is virtual, so hours of auctions take seconds
+and the same seed gives the same report on any machine:
+it stands still while the ticks are processed and moves only when the chronograph waits.
+Every tick takes --tick-time seconds of the virtual time in one of the --concurrency slots,
+the next claim waits for the claimed ticks and the clock moves by the time of the batch,
+when there is nothing to claim it jumps to the next timer.
+Auctions that start at the same moment compete for the tick slots, which shows up as the stage start lateness.
+With --tick-time 0 a tick takes as much virtual time as its real duration, so the lateness follows
+the speed of the tick on this machine and the report is no longer the same from run to run.
+--wall-time adds the real duration of the ticks to the report, which is what catches a slower tick.
+
+Usage:
+    MONGODB_URL=mongodb://localhost:27017 PYTHONPATH=src \
+    python benchmarks/chronograph_simulator.py --auctions 500 --bidders 3 --concurrency 10 --batch-size 10 \
+    --tick-time 0.05
+
+The database (MONGODB_DATABASE, "prozorro-auction-simulation" by default) is cleaned up,
+so its name must contain "simulation".
+"""
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from heapq import heappop, heappush
+from time import perf_counter, time as real_time
+from uuid import uuid4
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Chronograph load simulation")
+    parser.add_argument("--auctions", type=int, default=100)
+    parser.add_argument("--bidders", type=int, default=2)
+    parser.add_argument("--spread", type=int, default=0,
+                        help="auctions start within this number of seconds (0 - all at once)")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--queue-size", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--tick-time", type=float, default=0.05,
+                        help="number of seconds of the virtual time a tick takes (0 - its real duration)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8765, help="port of the fake tenders api")
+    parser.add_argument("--json", action="store_true", help="print the report as json")
+    parser.add_argument("--wall-time", action="store_true",
+                        help="add the real duration of the simulation and its ticks, it differs from run to run")
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """
+    The settings are read from the environment on import, so this goes before importing the chronograph
+    """
+    fake_host = f"http://127.0.0.1:{args.port}"
+    os.environ.setdefault("MONGODB_DATABASE", "prozorro-auction-simulation")
+    if "simulation" not in os.environ["MONGODB_DATABASE"]:
+        raise SystemExit("The simulator cleans up its database, MONGODB_DATABASE must contain 'simulation'")
+    os.environ.update(
+        API_HOST=fake_host,
+        DS_HOST=fake_host,
+        CHRONOGRAPH_CONCURRENCY=str(args.concurrency),
+        CHRONOGRAPH_QUEUE_SIZE=str(args.queue_size),
+        CHRONOGRAPH_BATCH_SIZE=str(args.batch_size),
+        CHRONOGRAPH_SCHEDULER="poll",
+        CHRONOGRAPH_OUTBOX_POLL_INTERVAL="0.05",
+    )
+
+
+# the simulated auctions start at the same moment on every run
+START_TIMESTAMP = datetime(2030, 1, 1, 8, tzinfo=timezone.utc).timestamp()
+
+
+class VirtualClock:
+    """
+    The time is moved by the simulator only, a tick sees the moment its slot has started it at
+    """
+
+    def __init__(self, start_timestamp):
+        self.now = start_timestamp
+        self._tick_start = ContextVar("tick_start", default=None)
+
+    def time(self):
+        tick_start = self._tick_start.get()
+        return self.now if tick_start is None else tick_start
+
+    def advance_to(self, timestamp):
+        self.now = max(self.now, timestamp)
+
+    def start_tick(self, timestamp):
+        return self._tick_start.set(timestamp)
+
+    def end_tick(self, token):
+        self._tick_start.reset(token)
+
+
+class FakeAPI:
+    """
+    Tenders api and document service answering every request successfully
+    """
+
+    def __init__(self):
+        self.tender_bids = {}
+        self.requests = defaultdict(int)
+
+    async def handle(self, request):
+        from aiohttp import web
+
+        path = request.path
+        self.requests[request.method] += 1
+        if request.method == "GET":
+            tender_id = path.split("/tenders/")[1].split("/")[0]
+            if path.endswith("/auction"):
+                data = {"bids": self.tender_bids[tender_id]}
+            else:
+                data = {"documents": []}
+        elif path == "/upload":
+            data = {
+                "url": f"http://127.0.0.1/get/{uuid4().hex}",
+                "hash": f"md5:{uuid4().hex}",
+                "format": "application/yaml",
+                "title": "audit.yaml",
+            }
+        elif "/documents" in path:
+            data = {"id": uuid4().hex}
+        else:
+            data = {}
+        return web.json_response({"data": data}, status=201 if request.method == "POST" else 200)
+
+    async def start(self, port):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        return runner
+
+
+def build_auctions(args, start_at, fake_api):
+    from prozorro_auction.databridge.model import build_stages, get_auction_bucket
+    from prozorro_auction.utils.ranking import calculate_bid_sort_key
+    from prozorro_auction.constants import TIMER_PRIORITIES
+
+    rnd = random.Random(args.seed)
+    auctions = []
+    for n in range(args.auctions):
+        auction_id = f"{n:032x}"
+        auction = {
+            "_id": auction_id,
+            "tender_id": auction_id,
+            "tenderID": f"UA-SIMULATION-{n}",
+            "lot_id": None,
+            "mode": None,
+            "auction_type": "default",
+            "procurementMethodType": "belowThreshold",
+            "start_at": start_at + timedelta(seconds=rnd.randint(0, args.spread)),
+            "bids": [],
+        }
+        for b in range(args.bidders):
+            amount = rnd.randint(100000, 200000)
+            bid = {
+                "id": f"{n:016x}{b:016x}",
+                "hash": uuid4().hex,
+                "date": start_at - timedelta(days=1, seconds=b),
+                "value": {"amount": amount},
+            }
+            bid["sort_key"] = calculate_bid_sort_key(bid, auction["auction_type"])
+            auction["bids"].append(bid)
+        auction["stages"] = build_stages(auction)
+
+        # every bidder has posted a lower amount for every round
+        for bid in auction["bids"]:
+            step = bid["value"]["amount"] // 100
+            bid["stages"] = {
+                str(i): {"amount": bid["value"]["amount"] - step * i, "time": stage["start"] + timedelta(seconds=10)}
+                for i, stage in enumerate(auction["stages"])
+                if stage["type"] == "bids"
+            }
+        auction.update(
+            current_stage=-1,
+            timer=auction["start_at"],
+            timer_priority=TIMER_PRIORITIES[auction["stages"][0]["type"]],
+            bucket=get_auction_bucket(auction_id),
+        )
+        fake_api.tender_bids[auction_id] = [{"id": bid["id"]} for bid in auction["bids"]]
+        auctions.append(auction)
+    return auctions
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def simulate(args):
+    from prozorro_auction.settings import TZ
+    from prozorro_auction.storage import get_mongodb_collection
+    from prozorro_auction.chronograph import main, model, stages, storage
+    from prozorro_auction.chronograph.metrics import registry
+    from prozorro_auction.chronograph.scheduler import timer_to_timestamp
+
+    start_at = datetime.fromtimestamp(START_TIMESTAMP, tz=TZ)
+    clock = VirtualClock(START_TIMESTAMP - 1)
+
+    def get_now():
+        return datetime.fromtimestamp(clock.time(), tz=TZ)
+
+    class VirtualDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            # ticks compare it with naive utc stage starts from the db
+            return datetime.utcfromtimestamp(clock.time())
+
+    storage.get_now = get_now
+    model.get_now = get_now
+    stages.datetime = VirtualDatetime
+    main.time = clock.time
+
+    ticks = 0
+    pending = 0  # claimed auctions whose ticks haven't finished
+    slots = [clock.now] * args.concurrency  # virtual moments the tick slots are free at
+    lateness = defaultdict(list)
+    tick_wall_times = []
+    process_auction = main.process_auction
+
+    async def counting_process_auction(auction, before_fetch_time):
+        nonlocal ticks, pending
+        next_stage = main.get_next_stage(auction)
+        current_stage = auction.get("current_stage", -1)
+        # the executor starts the ticks in the claimed order, each one in the slot that is free first
+        tick_start = heappop(slots)
+        token = clock.start_tick(tick_start)
+        started = perf_counter()
+        try:
+            await process_auction(auction, before_fetch_time)
+        finally:
+            wall_time = perf_counter() - started
+            clock.end_tick(token)
+            tick_end = tick_start + (args.tick_time or wall_time)
+            heappush(slots, tick_end)
+            pending -= 1
+        ticks += 1
+        tick_wall_times.append(wall_time)
+        if next_stage and auction.get("current_stage") == current_stage + 1:
+            lateness[next_stage["type"]].append(tick_end - timer_to_timestamp(next_stage["start"]))
+
+    def claiming(claim):
+        async def claim_after_ticks(*claim_args, **claim_kwargs):
+            # the claimed ticks are finished first, so what is claimed doesn't depend on their real duration
+            nonlocal pending, slots
+            while pending:
+                await asyncio.sleep(0.001)
+            clock.advance_to(max(slots))
+            slots = [clock.now] * args.concurrency
+            result = await claim(*claim_args, **claim_kwargs)
+            pending += len(result) if isinstance(result, list) else int(result is not None)
+            return result
+        return claim_after_ticks
+
+    auctions_collection = get_mongodb_collection()
+    outbox_collection = get_mongodb_collection(storage.OUTBOX_COLLECTION)
+
+    async def wait_for_timers():
+        # nothing has been claimed, so no tick is running
+        auction = await auctions_collection.find_one(
+            {"timer": {"$exists": True}}, projection=("timer",), sort=(("timer", 1),)
+        )
+        if auction is not None:
+            return clock.advance_to(timer_to_timestamp(auction["timer"]))
+        if await outbox_collection.count_documents({}):
+            # the fake api doesn't fail, so the jobs are published by the outbox workers without delays
+            return await asyncio.sleep(0.01)
+        main.KEEP_RUNNING = False
+
+    main.process_auction = counting_process_auction
+    main.wait_for_timers = wait_for_timers
+    main.claim_expired_timers = claiming(main.claim_expired_timers)
+    main.increase_and_read_expired_timer = claiming(main.increase_and_read_expired_timer)
+
+    for name in (None, storage.OUTBOX_COLLECTION, storage.DEAD_LETTERS_COLLECTION, storage.MEMBERS_COLLECTION):
+        await (get_mongodb_collection(name) if name else auctions_collection).delete_many({})
+
+    fake_api = FakeAPI()
+    runner = await fake_api.start(args.port)
+    auctions = build_auctions(args, start_at, fake_api)
+    await auctions_collection.insert_many(auctions)
+
+    started = real_time()
+    await main.chronograph_loop()
+    duration = real_time() - started
+    await runner.cleanup()
+
+    finished = await auctions_collection.count_documents({"current_stage": {"$gte": 0}, "timer": {"$exists": False}})
+    report = {
+        "auctions": args.auctions,
+        "bidders": args.bidders,
+        "concurrency": args.concurrency,
+        "batch_size": args.batch_size,
+        "tick_time": args.tick_time,
+        "finished_auctions": finished,
+        "ticks": ticks,
+        "simulated_duration": clock.now - START_TIMESTAMP,
+        "lateness": {
+            stage_type: {
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "max": max(values),
+            }
+            for stage_type, values in lateness.items()
+        },
+        "lease_steals": registry.get_sample_value("chronograph_lease_steals_counter_total") or 0,
+        "lease_lost": sum(
+            registry.get_sample_value("chronograph_lease_lost_counter_total", {"detected_by": detected_by}) or 0
+            for detected_by in ("heartbeat", "save")
+        ),
+        "api_requests": dict(sorted(fake_api.requests.items())),
+    }
+    if args.wall_time:
+        report["wall_time"] = duration
+        report["tick_wall_time"] = {
+            "p50": percentile(tick_wall_times, 50),
+            "p95": percentile(tick_wall_times, 95),
+            "p99": percentile(tick_wall_times, 99),
+            "max": max(tick_wall_times),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"auctions: {report['auctions']} ({report['finished_auctions']} finished), "
+          f"bidders: {report['bidders']}, "
+          f"concurrency: {report['concurrency']}, batch size: {report['batch_size']}, "
+          f"tick time: {report['tick_time']}s")
+    print(f"ticks: {report['ticks']} in {report['simulated_duration']:.2f}s of the simulated time")
+    if "wall_time" in report:
+        print(f"wall time: {report['wall_time']:.2f}s")
+        tick_wall_time = report["tick_wall_time"]
+        print(f"tick wall time, ms: p50 {tick_wall_time['p50'] * 1000:.3f}, p95 {tick_wall_time['p95'] * 1000:.3f}, "
+              f"p99 {tick_wall_time['p99'] * 1000:.3f}, max {tick_wall_time['max'] * 1000:.3f}")
+    print(f"{'stage lateness, s':<20} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for stage_type, values in sorted(report["lateness"].items()):
+        print(f"{stage_type:<20} {values['p50']:>8.3f} {values['p95']:>8.3f} "
+              f"{values['p99']:>8.3f} {values['max']:>8.3f}")
+    print(f"lock violations: {report['lease_steals']:.0f} lease steals, {report['lease_lost']:.0f} lost leases")
+    print(f"api requests: {report['api_requests']}")
+
+
+def main():
+    args = parse_args()
+    configure_environment(args)
+    random.seed(args.seed)
+    logging.basicConfig(level=logging.WARNING)
+
+    report = asyncio.get_event_loop().run_until_complete(simulate(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
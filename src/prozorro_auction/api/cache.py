@@ -0,0 +1,152 @@
+from prozorro_auction.api.settings import API_CACHE_SIZE, API_CACHE_TTL
+from prozorro_auction.api.storage import get_auction, GET_FIELDS, POST_BID_FIELDS, CHANGES_WATCHER
+from prozorro_auction.api.metrics import (
+    api_auction_cache_counter,
+    api_auction_cache_size_gauge,
+    api_payload_cache_counter,
+    api_payload_bytes_counter,
+)
+from prozorro_auction.api.mask import mask_data
+from prozorro_auction.api.utils import json_dumps, get_auction_version
+from collections import OrderedDict
+from time import monotonic
+
+
+class AuctionCache:
+    """
+    Read-through LRU cache of auctions read with `fields`,
+    an entry is read again after `ttl` seconds or when it's invalidated.
+    A read doesn't replace the entry if the change stream has changed it in the meantime.
+    The cached auctions are shared by the requests and must not be changed
+    """
+
+    def __init__(self, name, fields, size=API_CACHE_SIZE, ttl=API_CACHE_TTL, time=monotonic):
+        self.name = name
+        self.fields = fields
+        self.size = size
+        self.ttl = ttl
+        self._time = time
+        self._entries = OrderedDict()  # auction_id -> (expires, auction)
+        self._reads = {}  # auction_id -> [reads in progress, changes applied during them]
+
+    async def get(self, auction_id):
+        entry = self._entries.get(auction_id)
+        if entry and entry[0] > self._time():
+            api_auction_cache_counter.labels(self.name, "hit").inc()
+            self._entries.move_to_end(auction_id)
+            return entry[1]
+        api_auction_cache_counter.labels(self.name, "miss").inc()
+        return await self.refresh(auction_id)
+
+    def peek(self, auction_id):
+        """
+        :return: the cached auction if it hasn't expired or None, the database isn't requested
+        """
+        entry = self._entries.get(auction_id)
+        if entry and entry[0] > self._time():
+            api_auction_cache_counter.labels(self.name, "hit").inc()
+            return entry[1]
+
+    async def refresh(self, auction_id):
+        read = self._reads.setdefault(auction_id, [0, 0])
+        read[0] += 1
+        changes = read[1]
+        try:
+            with CHANGES_WATCHER.reading():  # the changes after the read are delivered to on_change
+                auction = await get_auction(auction_id, fields=self.fields)
+        finally:
+            read[0] -= 1
+            if read[0] == 0:
+                del self._reads[auction_id]
+        if read[1] == changes:
+            self.set(auction_id, auction)
+        else:
+            # the entry has been changed during the read, it isn't replaced with what may be older
+            entry = self._entries.get(auction_id)
+            if entry:
+                auction = entry[1]
+                self.set(auction_id, auction)
+        return auction
+
+    def set(self, auction_id, auction):
+        self._entries[auction_id] = (self._time() + self.ttl, auction)
+        self._entries.move_to_end(auction_id)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        api_auction_cache_size_gauge.labels(self.name).set(len(self._entries))
+
+    def invalidate(self, auction_id):
+        if self._entries.pop(auction_id, None):
+            api_auction_cache_size_gauge.labels(self.name).set(len(self._entries))
+
+    def get_auction_ids(self):
+        return self._entries.keys()
+
+    def on_change(self, auction):
+        """
+        Applies a change of the auction from the change stream, the auctions that aren't cached are skipped
+        :param auction: the changed auction with GET_FIELDS
+        """
+        entry = self._entries.get(auction["_id"])
+        if entry is None:
+            return
+        if all(f in GET_FIELDS for f in self.fields):
+            self._entries[auction["_id"]] = (entry[0], {k: v for k, v in auction.items() if k in self.fields})
+        elif entry[1].get("modified") != auction.get("modified"):
+            # posted bids don't update "modified", so the auction has got a new stage or has been rescheduled
+            self.invalidate(auction["_id"])
+        else:
+            return
+        if auction["_id"] in self._reads:
+            self._reads[auction["_id"]][1] += 1
+
+
+class PayloadCache:
+    """
+    Masked and serialized auctions by their version (see get_auction_version),
+    so the viewers of an auction get the same json instead of building it again
+    """
+
+    def __init__(self, size=API_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()  # auction_id -> (version, text, body)
+
+    def _get_entry(self, auction):
+        auction_id = auction["_id"]
+        version = get_auction_version(auction)
+        entry = self._entries.get(auction_id)
+        if entry and entry[0] == version:
+            api_payload_cache_counter.labels("hit").inc()
+            self._entries.move_to_end(auction_id)
+        else:
+            api_payload_cache_counter.labels("miss").inc()
+            text = json_dumps(mask_data(auction))
+            entry = self._entries[auction_id] = (version, text, text.encode("utf-8"))
+            self._entries.move_to_end(auction_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def get_body(self, auction):
+        body = self._get_entry(auction)[2]
+        api_payload_bytes_counter.labels("http").inc(len(body))
+        return body
+
+    def get_text(self, auction):
+        entry = self._get_entry(auction)
+        api_payload_bytes_counter.labels("ws").inc(len(entry[2]))
+        return entry[1]
+
+
+AUCTION_CACHE = AuctionCache("auction", GET_FIELDS)
+POST_BID_CACHE = AuctionCache("post_bid", POST_BID_FIELDS)
+PAYLOAD_CACHE = PayloadCache()
+
+
+def get_cached_auction_ids():
+    return AUCTION_CACHE.get_auction_ids() | POST_BID_CACHE.get_auction_ids()
+
+
+def update_caches(auction):
+    AUCTION_CACHE.on_change(auction)
+    POST_BID_CACHE.on_change(auction)
@@ -3,6 +3,9 @@ import sentry_sdk
 from prozorro_auction.api.logging import AccessLogger
 from prozorro_auction.settings import API_PORT, SENTRY_DSN, SENTRY_ENVIRONMENT
 from prozorro_auction.api.views import routes
+from prozorro_auction.api.sockets import start_auction_feed, stop_auction_feed
+from prozorro_auction.api.metrics import start_metrics_server, stop_metrics_server
+from prozorro_auction.api.settings import API_METRICS_PORT
 from prozorro_auction.logging import setup_logging, update_log_context
 from sentry_sdk.integrations.aiohttp import AioHttpIntegration
 from aiohttp import web
@@ -18,6 +21,11 @@ if SENTRY_DSN:
 def create_application():
     app = web.Application()
     app.add_routes(routes)
+    app.on_startup.append(start_auction_feed)
+    app.on_cleanup.append(stop_auction_feed)
+    if API_METRICS_PORT:
+        app.on_startup.append(start_metrics_server)
+        app.on_cleanup.append(stop_metrics_server)
     return app
 
 
@@ -42,18 +42,24 @@ def mask_process_compound(data):
     if isinstance(data, list):
         data = [mask_process_compound(e) for e in data]
     elif isinstance(data, dict):
+        masked = {}
         for i, j in data.items():
             if not ignore_mask(i):
                 j = mask_process_compound(j)
                 if i == "identifier":  # identifier.id
                     j["id"] = mask_simple_data(j["id"])
-            data[i] = j
+            masked[i] = j
+        data = masked
     else:
         data = mask_simple_data(data)
     return data
 
 
 def mask_data(obj):
+    """
+    :return: a copy of the object with masked data, the object itself isn't changed as it may be cached
+    """
+    obj = dict(obj)
     is_masked = obj.pop("is_masked", False)
     if (
         MASK_OBJECT_DATA_SINGLE and is_masked
@@ -66,3 +72,4 @@ def mask_data(obj):
         for k in MASK_FIELDS:
             if k in obj:
                 obj[k] = mask_process_compound(obj[k])
+    return obj
@@ -0,0 +1,55 @@
+from prozorro_auction.api.settings import API_METRICS_PORT
+from aiohttp.abc import AbstractAccessLogger
+from aiohttp import web
+import prometheus_client
+
+registry = prometheus_client.CollectorRegistry()  # without default python metrics
+api_auction_cache_counter = prometheus_client.Counter(
+    'api_auction_cache_counter',
+    'Number of auction reads by the cache and result: hit or miss',
+    ['cache', 'result'],
+    registry=registry,
+)
+api_auction_cache_size_gauge = prometheus_client.Gauge(
+    'api_auction_cache_size_gauge',
+    'Number of cached auctions',
+    ['cache'],
+    registry=registry,
+)
+
+api_payload_cache_counter = prometheus_client.Counter(
+    'api_payload_cache_counter',
+    'Number of auction payloads by the result: hit or miss (masked and serialized again)',
+    ['result'],
+    registry=registry,
+)
+api_payload_bytes_counter = prometheus_client.Counter(
+    'api_payload_bytes_counter',
+    'Number of bytes of the auction payloads served by http or websocket',
+    ['transport'],
+    registry=registry,
+)
+
+
+async def metrics(_):
+    response = web.Response(body=prometheus_client.generate_latest(registry=registry))
+    response.content_type = prometheus_client.CONTENT_TYPE_LATEST
+    return response
+
+
+class AccessLogger(AbstractAccessLogger):
+    def log(self, request, response, time):
+        pass
+
+
+async def start_metrics_server(app):
+    metrics_app = web.Application()
+    metrics_app.router.add_get('/metrics', metrics)
+    runner = web.AppRunner(metrics_app, access_log_class=AccessLogger)
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', API_METRICS_PORT).start()
+    app["metrics_runner"] = runner
+
+
+async def stop_metrics_server(app):
+    await app["metrics_runner"].cleanup()
@@ -216,7 +216,7 @@ def get_bid_response_data(auction, bid):
         if auction_stage["type"] == "bids" and auction_stage["bidder_id"] == bid["id"]:
             bid_data = bid.get("stages", {}).get(str(current_stage), {})
         if bid_data:
-            bid_data["changed"] = True
+            bid_data = dict(bid_data, changed=True)
         else:  # for esco we return latest saved bid if no bids made in the current round
             bid_data = bid["value"]
         resp_data = {
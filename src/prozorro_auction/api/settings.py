@@ -0,0 +1,17 @@
+import os
+
+
+# auctions read by the api are kept in memory, the least recently used ones are dropped above the size
+API_CACHE_SIZE = int(os.environ.get("API_CACHE_SIZE", 1000))
+# number of seconds a cached auction is used without reading it again
+API_CACHE_TTL = float(os.environ.get("API_CACHE_TTL", 60))
+
+# the change stream of the watched auctions waits for changes up to this number of seconds,
+# then it checks whether new auctions are watched
+API_WATCH_MAX_AWAIT = float(os.environ.get("API_WATCH_MAX_AWAIT", 0.5))
+# the stream is opened again to add new auctions at most once per this number of seconds,
+# their changes made in between are delivered after that
+API_WATCH_REOPEN_INTERVAL = float(os.environ.get("API_WATCH_REOPEN_INTERVAL", 1))
+
+# prometheus metrics are served on a separate port, 0 disables them
+API_METRICS_PORT = int(os.environ.get("API_METRICS_PORT", 9092))
@@ -3,6 +3,8 @@ import asyncio
 from prozorro_crawler.logging import log_context
 
 from prozorro_auction.api.storage import watch_changed_docs
+from prozorro_auction.api.cache import update_caches, get_cached_auction_ids
+from prozorro_auction.api.utils import get_auction_version
 
 logger = logging.getLogger(__name__)
 
@@ -15,13 +17,30 @@ def get_auction_feed():
     return AUCTION_FEED
 
 
+async def start_auction_feed(app):
+    """
+    The feed keeps the cached auctions up to date, so it's started with the application
+    """
+    get_auction_feed()
+
+
+async def stop_auction_feed(app):
+    global AUCTION_FEED
+    if AUCTION_FEED:
+        AUCTION_FEED.stop()
+        AUCTION_FEED = None
+
+
 MESSAGE_CHANGES_FOUND = 1
 
 class AuctionFeed:
 
     def __init__(self):
         self._auctions = {}
-        asyncio.create_task(self._process_changes_loop())
+        self._task = asyncio.create_task(self._process_changes_loop())
+
+    def stop(self):
+        self._task.cancel()
 
     async def get(self, auction_id, socket):
         auction = self._auctions.get(auction_id, {})
@@ -53,16 +72,21 @@ class AuctionFeed:
             logger.info(f"Empty subscribers set for {auction_id}: discarding its cached object")
             del self._auctions[auction_id]
 
+    def get_watched_ids(self):
+        # the cached auctions are kept up to date by the same changes
+        return self._auctions.keys() | get_cached_auction_ids()
+
     async def _process_changes_loop(self):
 
-        async for auction in watch_changed_docs():
+        async for auction in watch_changed_docs(self.get_watched_ids):
             auction_id = auction["_id"]
             with log_context(AUCTION_ID=auction_id):
                 logger.info(f"Capture change of auction")
+                update_caches(auction)
 
                 if auction_id in self._auctions:
                     save_doc = self._auctions[auction_id]["doc"]
-                    if save_doc is None or save_doc["modified"] != auction["modified"]:
+                    if save_doc is None or get_auction_version(save_doc) != get_auction_version(auction):
                         self._auctions[auction_id]["doc"] = auction
                         subscribers = self._auctions[auction_id]["subscribers"]
                         dead_sockets = []
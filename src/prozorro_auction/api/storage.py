@@ -1,10 +1,13 @@
 from prozorro_auction.storage import get_mongodb_collection
 from prozorro_auction.settings import MONGODB_ERROR_INTERVAL
+from prozorro_auction.api.settings import API_WATCH_MAX_AWAIT, API_WATCH_REOPEN_INTERVAL
 from prozorro_auction.utils.base import get_now
 from pymongo import ASCENDING
 from pymongo.collection import ReturnDocument
 from pymongo.errors import PyMongoError
 from aiohttp import web
+from contextlib import contextmanager
+from time import monotonic
 import asyncio
 import logging
 
@@ -50,18 +53,40 @@ GET_FIELDS = (
     "is_masked",
 )
 
+# fields validating posted bids, bid "stages" are updated by the posts and aren't needed
+POST_BID_FIELDS = (
+    "modified",
+    "current_stage",
+    "stages",
+    "features",
+    "minimalStep",
+    "procurementMethodType",
+    "fundingKind",
+    "yearlyPaymentsPercentageRange",
+    "NBUdiscountRate",
+    "noticePublicationDate",
+    "minimalStepPercentage",
+    "bids.id",
+    "bids.hash",
+    "bids.value",
+    "bids.coeficient",
+    "bids.non_price_cost",
+    "bids.denominator",
+    "bids.addition",
+)
+
 
 def to_projections(fields):
     return {field: 1 for field in fields}
 
 
-async def read_auction_list(skip, limit=10):
+async def read_auction_list(skip, limit=10, fields=LIST_FIELDS):
     collection = get_mongodb_collection()
     auctions = []
     midnight = get_now().replace(hour=0, minute=0, second=0, microsecond=0)
     cursor = collection.find(
         {"start_at": {"$gt": midnight}},
-        to_projections(LIST_FIELDS)
+        to_projections(fields)
     ).sort("start_at", ASCENDING)
     async for obj in cursor.skip(skip * limit).limit(limit):
         auctions.append(obj)
@@ -81,34 +106,128 @@ async def get_auction(auction_id, fields=GET_FIELDS):
         return result
 
 
-async def watch_changed_docs():
+async def get_auction_bid(auction_id, bid_id):
     collection = get_mongodb_collection()
-    resume_after = None
+    try:
+        result = await collection.find_one({'_id': auction_id}, {"bids": {"$elemMatch": {"id": bid_id}}})
+    except PyMongoError as e:
+        logger.error(f"Get auction bid {type(e)}: {e}", extra={"MESSAGE_ID": "MONGODB_EXC"})
+        raise web.HTTPInternalServerError()
+    else:
+        if not result or not result.get("bids"):
+            raise web.HTTPNotFound()
+        return result["bids"][0]
+
+
+def get_changes_pipeline(auction_ids):
+    """
+    The server sends only the changes of the watched auctions and only their GET_FIELDS
+    """
+    return [
+        {
+            "$match": {
+                "operationType": {"$in": ["insert", "update", "replace"]},
+                "documentKey._id": {"$in": list(auction_ids)},
+            }
+        },
+        {
+            "$project": {
+                "operationType": 1,
+                "documentKey": 1,
+                **{f"fullDocument.{field}": 1 for field in GET_FIELDS},
+            }
+        },
+    ]
+
+
+class ChangesWatcher:
+    """
+    Watches the changes of the auctions returned by `get_auction_ids` with one change stream.
+    The stream is kept open while there are no ids too, so it always knows its position.
+    The reads of the auctions to be watched are wrapped with `reading`:
+    the stream that adds their ids resumes from the position before the first of the reads,
+    so the changes between the reads and the new stream aren't missed
+    (the changes of the auctions watched before are delivered again).
+    New ids are added at most once per `reopen_interval` seconds, the ids that aren't watched anymore
+    are dropped with them, so the stream isn't opened again on every cache miss or eviction
+    """
+
+    def __init__(self, reopen_interval=API_WATCH_REOPEN_INTERVAL, time=monotonic):
+        self.reopen_interval = reopen_interval
+        self._time = time
+        self._resume_token = None
+        self._reads = 0
+        self._read_pending = False
+        self._read_token = None
+
+    @contextmanager
+    def reading(self):
+        if not self._read_pending:
+            self._read_pending = True
+            self._read_token = self._resume_token
+        self._reads += 1
+        try:
+            yield
+        finally:
+            self._reads -= 1
+
+    def _get_resume_token(self):
+        resume_after = self._read_token if self._read_pending else self._resume_token
+        if self._reads == 0:
+            self._read_pending = False
+        # otherwise the auctions being read are added by the next stream from the same position
+        return resume_after
 
-    while True:
-        logger.info(f"Start watching mongodb changes after {resume_after}")
-        changes = collection.watch(full_document="updateLookup", resume_after=resume_after)
+    async def watch(self, get_auction_ids):
+        """
+        Yields the changed auctions
+        """
+        collection = get_mongodb_collection()
+        self._resume_token = None
 
         while True:
-            try:
-                change = await changes.next()
-            except PyMongoError as e:
-                logger.error(f"Got feed error {type(e)}: {e}", extra={"MESSAGE_ID": "MONGODB_EXC"})
-                await asyncio.sleep(MONGODB_ERROR_INTERVAL)
-            except StopAsyncIteration as e:
-                logger.exception(e)
-                resume_after = None
-                break
-            except Exception as e:
-                logger.exception(e)
-                await asyncio.sleep(MONGODB_ERROR_INTERVAL)
-            else:
-                resume_after = change["_id"]
-                if "fullDocument" in change:   # present in insert/update changes
-                    auction = {k: v
-                               for k, v in change["fullDocument"].items()
-                               if k in GET_FIELDS}
-                    yield auction
+            auction_ids = set(get_auction_ids())
+            resume_after = self._get_resume_token()
+            logger.info(f"Start watching mongodb changes of {len(auction_ids)} auctions after {resume_after}")
+            changes = collection.watch(
+                get_changes_pipeline(auction_ids),
+                full_document="updateLookup",
+                resume_after=resume_after,
+                max_await_time_ms=int(API_WATCH_MAX_AWAIT * 1000),
+            )
+            opened = self._time()
+
+            while True:
+                new_ids = set(get_auction_ids()) - auction_ids
+                if not new_ids and self._reads == 0:
+                    self._read_pending = False  # the auctions read are watched already
+                if new_ids and self._time() - opened >= self.reopen_interval:
+                    break
+                try:
+                    change = await changes.try_next()
+                except PyMongoError as e:
+                    logger.error(f"Got feed error {type(e)}: {e}", extra={"MESSAGE_ID": "MONGODB_EXC"})
+                    await asyncio.sleep(MONGODB_ERROR_INTERVAL)
+                except Exception as e:
+                    logger.exception(e)
+                    await asyncio.sleep(MONGODB_ERROR_INTERVAL)
+                else:
+                    if changes.resume_token is not None:
+                        self._resume_token = changes.resume_token
+                    if change is None:
+                        if not changes.alive:  # invalidated
+                            self._resume_token = self._read_token = None
+                            break
+                    elif change.get("fullDocument"):  # None if the auction is deleted already
+                        yield change["fullDocument"]
+            await changes.close()
+
+
+CHANGES_WATCHER = ChangesWatcher()
+
+
+def watch_changed_docs(get_auction_ids):
+    return CHANGES_WATCHER.watch(get_auction_ids)
 
 
 async def insert_auction(data):
@@ -131,10 +250,19 @@ async def insert_auction(data):
 
 
 async def update_auction_bid_stage(auction_id, bid_id, stage_id, value):
+    """
+    Saves the bid only if the auction is still at the bids stage of the bidder
+    :return: the auction with the only updated bid or None if the stage has changed
+    """
     collection = get_mongodb_collection()
     try:
         result = await collection.find_one_and_update(
-            {"_id": auction_id},
+            {
+                "_id": auction_id,
+                "current_stage": stage_id,
+                f"stages.{stage_id}.type": "bids",
+                f"stages.{stage_id}.bidder_id": bid_id,
+            },
             {
                 "$set" if value else "$unset": {
                     f"bids.$[bid].stages.{stage_id}": value
@@ -143,6 +271,7 @@ async def update_auction_bid_stage(auction_id, bid_id, stage_id, value):
             array_filters=[
                 {"bid.id": bid_id},
             ],
+            projection={"bids": {"$elemMatch": {"id": bid_id}}},
             return_document=ReturnDocument.AFTER
         )
         return result
@@ -1,6 +1,7 @@
 from aiohttp import web
 from prozorro_auction.settings import TZ
 from datetime import datetime
+from hashlib import md5
 import json
 import pytz
 
@@ -25,6 +26,48 @@ def json_response(data, status=200):
     return web.json_response(data, status=status, dumps=json_dumps)
 
 
+def get_auction_version(auction):
+    """
+    The chronograph moves "timer" without updating "modified" (leases and retries of the ticks),
+    so both of them version the served auction
+    """
+    return auction.get("modified"), auction.get("timer")
+
+
+def get_etag(auctions):
+    """
+    ETag of the auctions' versions, the auctions should have "_id" and the fields of get_auction_version
+    """
+    versions = json_dumps([(a["_id"], *get_auction_version(a)) for a in auctions])
+    return f'"{md5(versions.encode()).hexdigest()}"'
+
+
+def get_last_modified(auctions):
+    dates = [a["modified"] for a in auctions if a.get("modified")]
+    return max(dates) if dates else None
+
+
+def is_not_modified(request, etag):
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        etags = {e.strip() for e in if_none_match.split(",")}
+        # proxies may weaken the tag
+        return "*" in etags or etag in etags or f"W/{etag}" in etags
+    return False
+
+
+def set_cache_headers(response, auctions):
+    response.headers["ETag"] = get_etag(auctions)
+    last_modified = get_last_modified(auctions)
+    if last_modified:
+        response.last_modified = last_modified  # naive datetime objects from mongodb are utc
+    return response
+
+
+def not_modified_response(etag):
+    return web.Response(status=304, headers={"ETag": etag})
+
+
 def get_forwarded_for(request):
     return FORWARDED_FOR_DELIMITER.join(request.headers.getall("X-Forwarded-For"))
 
@@ -4,12 +4,20 @@ from prozorro_auction.logging import update_log_context
 from prozorro_auction.api.storage import (
     read_auction_list,
     get_auction,
+    LIST_FIELDS,
+    get_auction_bid,
     update_auction_bid_stage,
 )
+from prozorro_auction.api.cache import AUCTION_CACHE, POST_BID_CACHE, PAYLOAD_CACHE
 from prozorro_auction.api.utils import (
     json_response,
     json_dumps,
     get_remote_addr,
+    get_etag,
+    is_not_modified,
+    not_modified_response,
+    set_cache_headers,
+    ValidationError,
 )
 from prozorro_auction.api.mask import mask_data
 from prozorro_auction.api.model import (
@@ -34,20 +42,35 @@ async def ping(request):
 @routes.get('/api/auctions')
 async def auction_list(request):
     _skip_param = int(request.query.get('page', 1)) - 1
-    list_auction = await read_auction_list(_skip_param)
+    if request.headers.get("If-None-Match"):
+        # only the versions of the listed auctions are read to check the tag
+        versions = await read_auction_list(_skip_param, fields=("_id", "modified"))
+        etag = get_etag(versions)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+
+    list_auction = await read_auction_list(_skip_param, fields=LIST_FIELDS + ("modified",))
+    versions = [{"_id": a["_id"], "modified": a.pop("modified", None)} for a in list_auction]
     # mask data
+    list_auction = [mask_data(a) for a in list_auction]
     for a in list_auction:
-        mask_data(a)
         a.pop("procuringEntity", "")
-    return json_response(list_auction, status=200)
+    return set_cache_headers(json_response(list_auction, status=200), versions)
 
 
 @routes.get('/api/auctions/{auction_id}')
 async def get_auction_by_id(request):
     _id = request.match_info['auction_id']
-    auction = await get_auction(_id)
-    mask_data(auction)
-    return json_response(auction, status=200)
+    if request.headers.get("If-None-Match"):
+        # the tag is checked with the cached auction or its version fields only
+        version = AUCTION_CACHE.peek(_id) or await get_auction(_id, fields=("modified", "timer"))
+        etag = get_etag([version])
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+
+    auction = await AUCTION_CACHE.get(_id)
+    response = web.Response(body=PAYLOAD_CACHE.get_body(auction), content_type="application/json")
+    return set_cache_headers(response, [auction])
 
 
 @routes.post('/api/log')
@@ -69,20 +92,8 @@ async def post_bid(request):
     client_id = request.cookies.get("client_id")
     hash_value = request.rel_url.query.get("hash")
     data = await request.json()
-    auction = await get_auction(
-        _id,
-        fields=(
-            "bids", "stages", "current_stage", "features", "minimalStep", "procurementMethodType",
-            "fundingKind", "yearlyPaymentsPercentageRange", "NBUdiscountRate",
-            "noticePublicationDate", "minimalStepPercentage",
-        )
-    )
-    bid = get_bid_by_bidder_id(auction, bidder_id)
-
-    posted_bid = get_posted_bid(auction, bid, hash_value, data)
-    auction = await update_auction_bid_stage(_id, bidder_id, auction["current_stage"], posted_bid)
-    bid = get_bid_by_bidder_id(auction, bidder_id)
-    # updated "auction" value is important to build response using "get_bid_response_data" (at least for esco)
+    auction, posted_bid, bid = await save_posted_bid(_id, bidder_id, hash_value, data)
+    # updated "bid" value is important to build response using "get_bid_response_data" (at least for esco)
 
     if auction["procurementMethodType"] == ProcurementMethodType.ESCO.value:
         if posted_bid:
@@ -117,6 +128,35 @@ async def post_bid(request):
     return json_response(resp_data, status=200)
 
 
+def is_bidder_stage(auction, bidder_id):
+    current_stage = auction.get("current_stage", 0)
+    if 0 <= current_stage < len(auction["stages"]):
+        stage = auction["stages"][current_stage]
+        return stage["type"] == "bids" and stage["bidder_id"] == bidder_id
+    return False
+
+
+async def save_posted_bid(auction_id, bidder_id, hash_value, data):
+    """
+    The bid is validated with the cached auction and saved by one conditional update,
+    the auction is read again only if it has switched to another stage since it was cached
+    :return: the auction, the posted bid and the updated bid
+    """
+    for use_cache in (True, False):
+        if use_cache:
+            auction = await POST_BID_CACHE.get(auction_id)
+            if not is_bidder_stage(auction, bidder_id):
+                continue  # the cached stage may be over
+        else:
+            auction = await POST_BID_CACHE.refresh(auction_id)
+        bid = get_bid_by_bidder_id(auction, bidder_id)
+        posted_bid = get_posted_bid(auction, bid, hash_value, data)
+        result = await update_auction_bid_stage(auction_id, bidder_id, auction["current_stage"], posted_bid)
+        if result:
+            return auction, posted_bid, result["bids"][0]
+    raise ValidationError("Stage not for bidding")
+
+
 @routes.post('/api/auctions/{auction_id}/check_authorization')
 async def check_authorization(request):
     data = await request.json()
@@ -125,11 +165,14 @@ async def check_authorization(request):
         client_id = data.get("client_id")
 
         _id = request.match_info["auction_id"]
-        auction = await get_auction(_id, fields=("bids", "stages", "current_stage", "procurementMethodType"))
+        auction = await POST_BID_CACHE.get(_id)
 
         bid = get_bid_by_bidder_id(auction, bidder_id)
         if bid["hash"] != hash_value:
             raise web.HTTPUnauthorized(text="hash is invalid")
+        if is_bidder_stage(auction, bidder_id):
+            # the bid posted at this stage is returned, the cached auction doesn't have them
+            bid = await get_auction_bid(_id, bidder_id)
 
         resp_data = get_bid_response_data(auction, bid)
         logger.info(
@@ -178,7 +221,7 @@ async def ws_handler(request):
     try:
         while not socket.closed:
             auction = await auction_feed.get(auction_id, socket)
-            await socket.send_json(auction, dumps=json_dumps)
+            await socket.send_str(PAYLOAD_CACHE.get_text(auction) if auction else json_dumps(auction))
     except ConnectionResetError as e:
         logger.info(f"ConnectionResetError at send updates {e}")
     except asyncio.CancelledError:
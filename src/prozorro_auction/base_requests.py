@@ -4,13 +4,21 @@ from json.decoder import JSONDecodeError
 import asyncio
 import aiohttp
 
+NOT_MODIFIED = object()
 
-async def request_tender(session, tender_id, json=None, method_name="get", url_suffix=""):
+
+async def request_tender(session, tender_id, json=None, method_name="get", url_suffix="", etag=None):
+    """
+    :param etag: ETag of the data the caller already has ("" if none),
+    then (NOT_MODIFIED, etag) is returned if it hasn't changed and (data, new etag) otherwise
+    """
     context = {"METHOD": method_name, "TENDER_ID": tender_id, "PATH": url_suffix}
     method = getattr(session, method_name)
     kwargs = {}
     if json:
         kwargs["json"] = context["JSON"] = json
+    if etag:
+        kwargs["headers"] = {"If-None-Match": etag}
     try:
         resp = await method(f"{BASE_URL}/{tender_id}{url_suffix}", **kwargs)
     except (aiohttp.ClientError, asyncio.TimeoutError) as e:
@@ -31,7 +39,11 @@ async def request_tender(session, tender_id, json=None, method_name="get", url_s
                         "Unexpected response contents",
                         extra={"MESSAGE_ID": "REQUEST_UNEXPECTED_ERROR", "CONTENTS": response, **context})
                 else:
+                    if etag is not None:
+                        return response["data"], resp.headers.get("ETag", "")
                     return response["data"]
+        elif resp.status == 304 and etag is not None:
+            return NOT_MODIFIED, resp.headers.get("ETag", etag)
         elif resp.status == 412:
             logger.warning("Precondition Failed while requesting tender",
                            extra={"MESSAGE_ID": "PRECONDITION_FAILED", **context})
@@ -0,0 +1,84 @@
+from prozorro_auction.base_requests import request_tender, NOT_MODIFIED
+from prozorro_auction.chronograph.settings import CHRONOGRAPH_TENDER_CACHE_TTL, CHRONOGRAPH_TENDER_CACHE_MAX_AGE
+from prozorro_auction.chronograph.metrics import chronograph_tender_cache_counter
+from time import monotonic
+import asyncio
+
+
+class TenderCache:
+    """
+    Keeps tender api responses for a short time, so lot auctions of one tender share them.
+    Fresh responses (up to `ttl` seconds) are returned without requests,
+    older ones are revalidated with If-None-Match and dropped after `max_age` seconds.
+    Concurrent requests of the same resource wait for one of them
+    """
+
+    def __init__(self, ttl=CHRONOGRAPH_TENDER_CACHE_TTL, max_age=CHRONOGRAPH_TENDER_CACHE_MAX_AGE, time=monotonic):
+        self.ttl = ttl
+        self.max_age = max_age
+        self._time = time
+        self._entries = {}  # (tender_id, url_suffix) -> [fetched, etag, data]
+        self._requests = {}  # (tender_id, url_suffix) -> future of the request in progress
+
+    async def get(self, session, tender_id, url_suffix=""):
+        key = (tender_id, url_suffix)
+        entry = self._entries.get(key)
+        if entry and self._time() - entry[0] < self.ttl:
+            chronograph_tender_cache_counter.labels(url_suffix or "/", "hit").inc()
+            return entry[2]
+
+        request = self._requests.get(key)
+        if request is not None:
+            chronograph_tender_cache_counter.labels(url_suffix or "/", "hit").inc()
+            try:
+                return await asyncio.shield(request)
+            except asyncio.CancelledError:
+                if not request.cancelled():
+                    raise  # this caller is cancelled
+            # the caller that made the request is cancelled, so it's made again
+            return await self.get(session, tender_id, url_suffix)
+
+        future = asyncio.get_event_loop().create_future()
+        self._requests[key] = future
+        try:
+            data = await self._fetch(session, key, entry)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # the waiters re-raise it, there may be none of them
+            raise
+        else:
+            future.set_result(data)
+            return data
+        finally:
+            del self._requests[key]
+
+    async def _fetch(self, session, key, entry):
+        tender_id, url_suffix = key
+        data, etag = await request_tender(session, tender_id, url_suffix=url_suffix, etag=entry[1] if entry else "")
+        if data is NOT_MODIFIED:
+            chronograph_tender_cache_counter.labels(url_suffix or "/", "revalidated").inc()
+            data = entry[2]
+        else:
+            chronograph_tender_cache_counter.labels(url_suffix or "/", "miss").inc()
+        self._purge()
+        self._entries[key] = [self._time(), etag, data]
+        return data
+
+    def update(self, tender_id, func, url_suffix=""):
+        """
+        Applies our own change to the cached data, so it stays usable until the next revalidation
+        """
+        entry = self._entries.get((tender_id, url_suffix))
+        if entry:
+            entry[2] = func(entry[2])
+
+    def invalidate(self, tender_id, url_suffix=""):
+        self._entries.pop((tender_id, url_suffix), None)
+
+    def _purge(self):
+        now = self._time()
+        for key in [k for k, e in self._entries.items() if now - e[0] >= self.max_age]:
+            del self._entries[key]
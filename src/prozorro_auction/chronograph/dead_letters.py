@@ -0,0 +1,56 @@
+"""
+Auctions chronograph has given up on after CHRONOGRAPH_MAX_ERRORS failed ticks
+or CHRONOGRAPH_OUTBOX_MAX_ATTEMPTS failed publications of their results ("publication" stage)
+
+Usage:
+    python -m prozorro_auction.chronograph.dead_letters list
+    python -m prozorro_auction.chronograph.dead_letters requeue <auction_id> [<auction_id> ...]
+    python -m prozorro_auction.chronograph.dead_letters requeue --all
+"""
+from prozorro_auction.chronograph.storage import read_dead_letters, requeue_dead_letter
+from prozorro_auction.utils.base import datetime_to_str
+import argparse
+import asyncio
+
+
+async def list_dead_letters():
+    dead_letters = await read_dead_letters()
+    for dead_letter in dead_letters:
+        print(
+            f"{dead_letter['_id']}\t{datetime_to_str(dead_letter['created'])}\t"
+            f"stage {dead_letter['current_stage']} ({dead_letter['stage']})\t"
+            f"errors {dead_letter['errors_count']}\t{dead_letter['error']}"
+        )
+    print(f"Total: {len(dead_letters)}")
+
+
+async def requeue(auction_ids, requeue_all=False):
+    if requeue_all:
+        auction_ids = [d["_id"] for d in await read_dead_letters()]
+    for auction_id in auction_ids:
+        if await requeue_dead_letter(auction_id):
+            print(f"{auction_id} is requeued")
+        else:
+            print(f"{auction_id} is not found in the dead letters")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chronograph dead letters")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="show the dead letters")
+    requeue_parser = subparsers.add_parser("requeue", help="let chronograph process the auctions again")
+    requeue_parser.add_argument("auction_ids", nargs="*")
+    requeue_parser.add_argument("--all", action="store_true", help="requeue all the dead letters")
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    if args.command == "list":
+        loop.run_until_complete(list_dead_letters())
+    elif args.command == "requeue":
+        if not args.auction_ids and not args.all:
+            parser.error("provide auction ids or --all")
+        loop.run_until_complete(requeue(args.auction_ids, requeue_all=args.all))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+from prozorro_auction.chronograph.metrics import (
+    chronograph_executor_queue_gauge,
+    chronograph_executor_in_progress_gauge,
+)
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TickExecutor:
+    """
+    Runs ticks of different auctions concurrently (up to `concurrency` at once)
+    and never runs two ticks of the same auction at the same time:
+    a tick of an auction that is already in progress waits for the previous one.
+    Up to `queue_size` submitted ticks may wait for a free slot.
+    """
+
+    def __init__(self, handler, concurrency=1, queue_size=0):
+        self._handler = handler
+        self._capacity = concurrency + queue_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._auction_locks = {}  # auction_id -> [lock, number of ticks using it]
+        self._tasks = set()
+        self._in_progress = 0
+
+    @property
+    def free_slots(self):
+        return self._capacity - len(self._tasks)
+
+    async def wait_for_free_slot(self):
+        while self.free_slots <= 0:
+            await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+
+    def submit(self, auction, *args):
+        task = asyncio.create_task(self._run(auction, *args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._update_metrics()
+        return task
+
+    async def drain(self):
+        """
+        Waits for all the submitted ticks to finish
+        """
+        if self._tasks:
+            logger.info(f"Waiting for {len(self._tasks)} ticks to finish")
+            await asyncio.gather(*self._tasks)
+
+    async def _run(self, auction, *args):
+        auction_id = auction["_id"]
+        lock_info = self._auction_locks.setdefault(auction_id, [asyncio.Lock(), 0])
+        lock_info[1] += 1
+        try:
+            async with lock_info[0]:
+                async with self._semaphore:
+                    self._in_progress += 1
+                    self._update_metrics()
+                    try:
+                        await self._handler(auction, *args)
+                    except Exception as e:
+                        logger.exception(e, extra={"MESSAGE_ID": "CHRONOGRAPH_TICK_EXCEPTION"})
+                    finally:
+                        self._in_progress -= 1
+        finally:
+            lock_info[1] -= 1
+            if not lock_info[1]:
+                del self._auction_locks[auction_id]
+            # the task is discarded from self._tasks right after this
+            self._update_metrics(finished=1)
+
+    def _update_metrics(self, finished=0):
+        chronograph_executor_in_progress_gauge.set(self._in_progress)
+        chronograph_executor_queue_gauge.set(len(self._tasks) - finished - self._in_progress)
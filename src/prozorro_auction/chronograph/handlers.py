@@ -0,0 +1,65 @@
+from prozorro_auction.chronograph.metrics import (
+    chronograph_stage_handler_time_histogram,
+    chronograph_stage_handler_calls_counter,
+)
+from time import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+STAGE_START = "start"
+STAGE_END = "end"
+
+# event -> stage type -> handler
+STAGE_HANDLERS = {
+    STAGE_START: {},
+    STAGE_END: {},
+}
+
+
+def register_stage_handler(event, stage_type, handler):
+    handlers = STAGE_HANDLERS[event]
+    if stage_type in handlers:
+        raise ValueError(f"Stage {event} handler for {stage_type} is already registered: {handlers[stage_type]}")
+    handlers[stage_type] = handler
+
+
+def on_stage_start(stage_type):
+    """
+    Registers a coroutine called with the auction when a stage of the type starts
+    """
+    def decorator(handler):
+        register_stage_handler(STAGE_START, stage_type, handler)
+        return handler
+    return decorator
+
+
+def on_stage_end(stage_type):
+    """
+    Registers a coroutine called with the auction when a stage of the type ends
+    """
+    def decorator(handler):
+        register_stage_handler(STAGE_END, stage_type, handler)
+        return handler
+    return decorator
+
+
+def get_stage_handler(event, stage_type):
+    return STAGE_HANDLERS[event].get(stage_type)
+
+
+async def run_stage_handler(event, stage_type, auction):
+    handler = get_stage_handler(event, stage_type)
+    if handler is None:
+        return
+
+    start_time = time()
+    try:
+        await handler(auction)
+    except Exception:
+        chronograph_stage_handler_calls_counter.labels(event, stage_type, "error").inc()
+        raise
+    else:
+        chronograph_stage_handler_calls_counter.labels(event, stage_type, "success").inc()
+    finally:
+        chronograph_stage_handler_time_histogram.labels(event, stage_type).observe(time() - start_time)
@@ -0,0 +1,107 @@
+from prozorro_auction.chronograph.settings import (
+    CHRONOGRAPH_HTTP_RATE,
+    CHRONOGRAPH_HTTP_MIN_RATE,
+    CHRONOGRAPH_HTTP_MAX_RATE,
+    CHRONOGRAPH_HTTP_RATE_INCREASE,
+    CHRONOGRAPH_HTTP_RATE_DECREASE,
+)
+from prozorro_auction.chronograph.metrics import (
+    chronograph_http_rate_gauge,
+    chronograph_http_rate_wait_histogram,
+)
+from time import monotonic
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+LIMITERS = {}
+MAX_RETRY_AFTER = 60
+
+
+class RateLimiter:
+    """
+    Token bucket whose rate is adjusted by the responses (AIMD):
+    every successful response adds `increase / rate` requests per second,
+    so the rate grows by about `increase` every second of successful requests,
+    and 429 or 5xx responses multiply it by `decrease`.
+    A burst of failed responses to the requests sent at the same rate is counted as one decrease.
+    """
+
+    def __init__(self, host, rate=CHRONOGRAPH_HTTP_RATE, min_rate=CHRONOGRAPH_HTTP_MIN_RATE,
+                 max_rate=CHRONOGRAPH_HTTP_MAX_RATE, increase=CHRONOGRAPH_HTTP_RATE_INCREASE,
+                 decrease=CHRONOGRAPH_HTTP_RATE_DECREASE, time=monotonic):
+        self.host = host
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self._time = time
+        self._lock = asyncio.Lock()  # waiters get the tokens in the order they came
+        self._tokens = 1
+        self._updated = self._time()
+        self._decreased = None
+        self._blocked_until = None
+        self._set_rate(rate)
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def _set_rate(self, rate):
+        self._rate = min(self.max_rate, max(self.min_rate, rate))
+        chronograph_http_rate_gauge.labels(self.host).set(self._rate)
+
+    def _refill(self):
+        now = self._time()
+        # up to one second of requests can be sent at once
+        self._tokens = min(max(self._rate, 1), self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def _get_delay(self):
+        now = self._time()
+        if self._blocked_until and self._blocked_until > now:
+            return self._blocked_until - now
+        self._refill()
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self._rate
+
+    async def acquire(self):
+        started = self._time()
+        async with self._lock:
+            delay = self._get_delay()
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = self._get_delay()
+            self._tokens -= 1
+        chronograph_http_rate_wait_histogram.labels(self.host).observe(self._time() - started)
+
+    def on_response(self, status, retry_after=None):
+        if status == 429 or status >= 500:
+            now = self._time()
+            if self._decreased is None or now - self._decreased >= 1 / self._rate:
+                self._decreased = now
+                self._set_rate(self._rate * self.decrease)
+                logger.warning(f"Decreased rate of requests to {self.host} to {self._rate:.2f}/s",
+                               extra={"MESSAGE_ID": "HTTP_RATE_DECREASED"})
+            if retry_after:
+                self._blocked_until = max(self._blocked_until or now, now + retry_after)
+        elif status < 400:
+            self._set_rate(self._rate + self.increase / self._rate)
+
+
+def get_rate_limiter(host):
+    if host not in LIMITERS:
+        LIMITERS[host] = RateLimiter(host)
+    return LIMITERS[host]
+
+
+def get_retry_after(headers):
+    """
+    Only the number of seconds is supported, http dates are ignored
+    """
+    try:
+        return min(float(headers.get("Retry-After")), MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        return None
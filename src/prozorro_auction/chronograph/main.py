@@ -1,18 +1,53 @@
-from prozorro_auction.chronograph.storage import increase_and_read_expired_timer, update_auction
-from prozorro_auction.chronograph.stages import tick_auction, POSTPONE_ANNOUNCEMENT_TD
+from prozorro_auction.chronograph.storage import (
+    increase_and_read_expired_timer,
+    claim_expired_timers,
+    update_auction,
+    copy_update_fields,
+    extend_lease,
+    add_dead_letter,
+    add_outbox_job,
+    prepare_storage,
+    get_lease_until,
+)
+from prozorro_auction.chronograph.stages import tick_auction
 from prozorro_auction.chronograph.model import get_verbose_current_stage
 from prozorro_auction.chronograph.metrics import (
     main as metrics_main,
     chronograph_processing_time_summary,
     chronograph_total_time_summary,
+    chronograph_claim_time_summary,
+    chronograph_claim_batch_size_histogram,
+    chronograph_lease_lost_counter,
+    chronograph_fetch_time_histogram,
+    chronograph_processing_time_histogram,
+    chronograph_save_time_histogram,
+    stage_start_lateness_seconds,
+)
+from prozorro_auction.chronograph.scheduler import TimerScheduler, timer_to_timestamp
+from prozorro_auction.chronograph.executor import TickExecutor
+from prozorro_auction.chronograph.outbox import OutboxWorkers
+from prozorro_auction.chronograph.partitions import Membership
+from prozorro_auction.chronograph.requests import close_session
+from prozorro_auction.chronograph.settings import (
+    CHRONOGRAPH_BATCH_SIZE,
+    CHRONOGRAPH_CONCURRENCY,
+    CHRONOGRAPH_QUEUE_SIZE,
+    CHRONOGRAPH_SCHEDULER,
+    CHRONOGRAPH_POLL_INTERVAL,
+    CHRONOGRAPH_OUTBOX_WORKERS,
+    CHRONOGRAPH_RETRY_BASE,
+    CHRONOGRAPH_RETRY_MAX_DELAY,
+    CHRONOGRAPH_MAX_ERRORS,
+    CHRONOGRAPH_PARTITIONING,
+    CHRONOGRAPH_LEASE,
+    CHRONOGRAPH_LEASE_RENEW_INTERVAL,
 )
 from prozorro_auction.exceptions import RetryException
-from prozorro_auction.settings import TZ, SENTRY_DSN
-from prozorro_auction.utils.base import get_now
+from prozorro_auction.settings import SENTRY_DSN
+from prozorro_auction.utils.base import get_backoff_delay, get_now
 from prozorro_auction.logging import setup_logging, update_log_context, log_context
-from datetime import timedelta
+from math import ceil
 from time import time
-import pytz
 import asyncio
 import signal
 import sentry_sdk
@@ -23,99 +58,195 @@ logger = logging.getLogger(__name__)
 
 
 KEEP_RUNNING = True
+SCHEDULER = None
+
+
+def get_scheduler():
+    global SCHEDULER
+    SCHEDULER = SCHEDULER or TimerScheduler()
+    return SCHEDULER
+
+
+async def wait_for_timers():
+    if CHRONOGRAPH_SCHEDULER == "watch":
+        await get_scheduler().wait()
+    else:
+        await asyncio.sleep(CHRONOGRAPH_POLL_INTERVAL)
 
 
 def stop_callback(signum, frame):
-    logger.info('Received shutdown signal. Stopping main loop...')
+    logger.info('Received shutdown signal. Stopping main loop and draining in-flight ticks...')
     global KEEP_RUNNING
     KEEP_RUNNING = False
+    if SCHEDULER:
+        SCHEDULER.wake()
 
 
-def configure_signals():
-    signal.signal(signal.SIGTERM, stop_callback)
-    signal.signal(signal.SIGINT, stop_callback)
+def configure_signals(loop):
+    # handlers are run by the event loop, so they can wake up the waiting coroutines
+    loop.add_signal_handler(signal.SIGTERM, stop_callback, signal.SIGTERM, None)
+    loop.add_signal_handler(signal.SIGINT, stop_callback, signal.SIGINT, None)
 
 
-async def postpone_timer_on_error(auction):
+async def postpone_timer_on_error(auction, error):
     """
     if an auction stage raises an exception,
-    we run retries with increased intervals
-    and finally we discard these tasks completely
+    we run retries with exponentially increased intervals
+    and finally move the auction to the dead letters
     :return:
     """
     data = {"_id": auction["_id"]}
     errors_count = auction.get("chronograph_errors_count", 0)
     errors_count += 1
-    if errors_count < 1000:
-        data.update(
-            timer=auction["timer"] + timedelta(seconds=errors_count),
-            chronograph_errors_count=errors_count,
-        )
-        logger.warning(f"Delaying auction processing for {errors_count} seconds")
+    data.update(chronograph_errors_count=errors_count)
+    if errors_count < CHRONOGRAPH_MAX_ERRORS:
+        delay = get_backoff_delay(errors_count, CHRONOGRAPH_RETRY_BASE, CHRONOGRAPH_RETRY_MAX_DELAY)
+        # the timer of a claimed auction is its lease expiry, so the delay starts now
+        data.update(timer=get_lease_until(get_now(), delay))
+        logger.warning(f"Delaying auction processing for {delay} seconds")
     else:
         data.update(timer=None)
-        logger.critical(f"Discarding processing auction")
-    await update_auction(data, update_date=False)
+        auction["chronograph_errors_count"] = errors_count
+        await add_dead_letter(auction, get_verbose_current_stage(auction), repr(error))
+        logger.critical(f"Discarding processing auction after {errors_count} errors, see dead letters",
+                        extra={"MESSAGE_ID": "CHRONOGRAPH_DEAD_LETTER"})
+    await update_auction(data, update_date=False, lease_owner=auction.get("lease_owner"))
+
+
+async def keep_lease(auction):
+    """
+    Extends the auction lease while its tick is running, so other workers don't claim it
+    """
+    while True:
+        await asyncio.sleep(CHRONOGRAPH_LEASE_RENEW_INTERVAL)
+        if not await extend_lease(auction["_id"], auction["lease_owner"], lock=CHRONOGRAPH_LEASE):
+            chronograph_lease_lost_counter.labels("heartbeat").inc()
+            return logger.critical("Auction lease has been lost during the tick",
+                                   extra={"MESSAGE_ID": "CHRONOGRAPH_LEASE_LOST"})
+
+
+async def process_auction(auction, before_fetch_time):
+    with log_context(AUCTION_ID=auction['_id']):
+        lease_owner = auction.get("lease_owner")
+        heartbeat = asyncio.create_task(keep_lease(auction)) if lease_owner else None
+        original = copy_update_fields(auction)
+        next_stage = get_next_stage(auction)
+        stage_type = next_stage.get("type", "unknown") if next_stage else "unknown"
+        before_run_time = time()
+        try:
+            await tick_auction(auction)
+        except RetryException as e:
+            logger.warning(e, extra={"MESSAGE_ID": "CHRONOGRAPH_TICK_RETRY"})
+            await stop_heartbeat(heartbeat)
+            await postpone_timer_on_error(auction, e)
+        except Exception as ex:
+            logger.exception(ex, extra={"MESSAGE_ID": "CHRONOGRAPH_TICK_EXCEPTION"})
+            await stop_heartbeat(heartbeat)
+            await postpone_timer_on_error(auction, ex)
+        else:
+            if auction.get("chronograph_errors_count"):
+                auction["chronograph_errors_count"] = 0  # the next failures start with short delays again
+            await stop_heartbeat(heartbeat)
+            before_save_time = time()
+            result = await update_auction(auction, original=original, lease_owner=lease_owner)
+            after_save_time = time()
+            if auction.pop("add_outbox_job", False) and (lease_owner is None or result.matched_count > 0):
+                # the results of a lost lease are discarded, so there is nothing to publish
+                await add_outbox_job(auction)
+
+            processing_time = before_save_time - before_run_time
+            total_time = after_save_time - before_fetch_time
+            extra_log = {
+                "MESSAGE_ID": "CHRONOGRAPH_TICK_TIME",
+                "PROCESSING_TIME": processing_time,
+                "TOTAL_TIME": total_time,
+                "FETCH_TIME":  before_run_time - before_fetch_time,
+                "SAVE_TIME": after_save_time - before_save_time,
+                "AUCTION_STAGE": get_verbose_current_stage(auction),
+            }
+            logger.info(
+                f"Processed auction, time - {processing_time}",
+                extra=extra_log
+            )
+            # metrics update
+            chronograph_total_time_summary.observe(total_time)
+            chronograph_processing_time_summary.observe(processing_time)
+            chronograph_fetch_time_histogram.labels(stage_type).observe(before_run_time - before_fetch_time)
+            chronograph_processing_time_histogram.labels(stage_type).observe(processing_time)
+            chronograph_save_time_histogram.labels(stage_type).observe(after_save_time - before_save_time)
+            if next_stage and auction.get("current_stage") == original.get("current_stage", -1) + 1:
+                # the auction has switched to the stage
+                lateness = after_save_time - timer_to_timestamp(next_stage["start"])
+                stage_start_lateness_seconds.labels(stage_type).observe(max(lateness, 0))
+        finally:
+            await stop_heartbeat(heartbeat)
+
+
+def get_next_stage(auction):
+    stages = auction.get("stages") or []
+    next_stage_index = auction.get("current_stage", -1) + 1
+    if 0 <= next_stage_index < len(stages):
+        return stages[next_stage_index]
+
+
+async def stop_heartbeat(heartbeat):
+    if heartbeat and not heartbeat.done():
+        heartbeat.cancel()
+        try:
+            await heartbeat
+        except asyncio.CancelledError:
+            pass
 
 
 async def chronograph_loop():
     logger.info('Starting chronograph service')
+    await prepare_storage()
+    outbox_workers = OutboxWorkers(CHRONOGRAPH_OUTBOX_WORKERS)
+    outbox_workers.start()
+    membership = Membership()
+    if CHRONOGRAPH_PARTITIONING:
+        membership_task = asyncio.create_task(membership.run())
+    executor = TickExecutor(
+        process_auction,
+        concurrency=CHRONOGRAPH_CONCURRENCY,
+        queue_size=CHRONOGRAPH_QUEUE_SIZE,
+    )
+    # a claimed auction may wait in the queue for a free tick slot, so the lock should cover that time
+    lock = CHRONOGRAPH_LEASE * (1 + ceil(CHRONOGRAPH_QUEUE_SIZE / CHRONOGRAPH_CONCURRENCY))
     while KEEP_RUNNING:
+        await executor.wait_for_free_slot()
+        if not KEEP_RUNNING:
+            break
+
         before_fetch_time = time()
-        auction = await increase_and_read_expired_timer()
-        if auction:
-            with log_context(AUCTION_ID=auction['_id']):
-                timer = auction["timer"]
-                before_run_time = time()
-                try:
-                    await tick_auction(auction)
-                except RetryException as e:
-                    logger.warning(e, extra={"MESSAGE_ID": "CHRONOGRAPH_TICK_RETRY"})
-                    await postpone_timer_on_error(auction)
-                except Exception as ex:
-                    logger.exception(ex, extra={"MESSAGE_ID": "CHRONOGRAPH_TICK_EXCEPTION"})
-                    await postpone_timer_on_error(auction)
-                else:
-                    before_save_time = time()
-                    await update_auction(auction)
-                    after_save_time = time()
-
-                    processing_time = before_save_time - before_run_time
-                    total_time = after_save_time - before_fetch_time
-                    current_ts = get_now()
-                    timer_time = pytz.utc.localize(timer).astimezone(TZ)
-                    extra_log = {
-                        "MESSAGE_ID": "CHRONOGRAPH_TICK_TIME",
-                        "PROCESSING_TIME": processing_time,
-                        "TOTAL_TIME": total_time,
-                        "FETCH_TIME":  before_run_time - before_fetch_time,
-                        "SAVE_TIME": after_save_time - before_save_time,
-                        "AUCTION_STAGE": get_verbose_current_stage(auction),
-                    }
-                    if (
-                        current_ts >= timer_time and not (
-                            auction["timer"] is None and processing_time < POSTPONE_ANNOUNCEMENT_TD.total_seconds()
-                            # it's been announcement stage
-                            # that takes longer due to its communicates with API CDB
-                        )
-                    ):
-                        logger.critical(
-                            "Auction processing takes more than its lock. This may lead to inconsistency of data!",
-                            extra=extra_log)
-                    else:
-                        logger.info(
-                            f"Processed auction, time - {processing_time}",
-                            extra=extra_log
-                        )
-                    # metrics update
-                    chronograph_total_time_summary.observe(total_time)
-                    chronograph_processing_time_summary.observe(processing_time)
+        if CHRONOGRAPH_BATCH_SIZE > 1:
+            # leases up to CHRONOGRAPH_BATCH_SIZE expired timers per round-trip
+            auctions = await claim_expired_timers(
+                min(CHRONOGRAPH_BATCH_SIZE, executor.free_slots),
+                lock=lock,
+                buckets=membership.buckets,
+            )
+            chronograph_claim_time_summary.observe(time() - before_fetch_time)
+            chronograph_claim_batch_size_histogram.observe(len(auctions))
         else:
-            await asyncio.sleep(1)
+            auction = await increase_and_read_expired_timer(lock=lock, buckets=membership.buckets)
+            auctions = [auction] if auction else []
+
+        for auction in auctions:
+            executor.submit(auction, before_fetch_time)
+        if not auctions:
+            await wait_for_timers()
+
+    if CHRONOGRAPH_PARTITIONING:
+        membership_task.cancel()
+        await membership.leave()
+    await executor.drain()
+    await outbox_workers.stop()
+    await close_session()
+    logger.info('Chronograph service stopped')
 
 
 if __name__ == '__main__':
-    configure_signals()
     if SENTRY_DSN:
         sentry_sdk.init(dsn=SENTRY_DSN)
 
@@ -123,5 +254,8 @@ if __name__ == '__main__':
     update_log_context(SYSLOG_IDENTIFIER="AUCTION_CHRONOGRAPH")
 
     loop = asyncio.get_event_loop()
+    configure_signals(loop)
     loop.create_task(metrics_main())
+    if CHRONOGRAPH_SCHEDULER == "watch":
+        loop.create_task(get_scheduler().run())
     loop.run_until_complete(chronograph_loop())
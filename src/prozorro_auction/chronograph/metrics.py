@@ -14,6 +14,144 @@ chronograph_total_time_summary = prometheus_client.Summary(
     'Time taken to fetch auction and process',
     registry=registry,
 )
+STAGE_TIME_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+chronograph_fetch_time_histogram = prometheus_client.Histogram(
+    'chronograph_fetch_time_histogram',
+    'Time taken to claim an auction and wait for a tick slot, by the type of the starting stage',
+    ['stage_type'],
+    buckets=STAGE_TIME_BUCKETS,
+    registry=registry,
+)
+chronograph_processing_time_histogram = prometheus_client.Histogram(
+    'chronograph_processing_time_histogram',
+    'Time taken to process an auction stage, by the type of the starting stage',
+    ['stage_type'],
+    buckets=STAGE_TIME_BUCKETS,
+    registry=registry,
+)
+chronograph_save_time_histogram = prometheus_client.Histogram(
+    'chronograph_save_time_histogram',
+    'Time taken to save a processed auction, by the type of the starting stage',
+    ['stage_type'],
+    buckets=STAGE_TIME_BUCKETS,
+    registry=registry,
+)
+stage_start_lateness_seconds = prometheus_client.Histogram(
+    'stage_start_lateness_seconds',
+    'Time between the scheduled start of a stage and saving the auction switched to it',
+    ['stage_type'],
+    buckets=(.1, .25, .5, 1, 2, 5, 10, 30, 60, 120, 300),
+    registry=registry,
+)
+chronograph_save_bytes_summary = prometheus_client.Summary(
+    'chronograph_save_bytes_summary',
+    'Size of the update saved by an auction tick, bytes',
+    registry=registry,
+)
+chronograph_timer_wait_histogram = prometheus_client.Histogram(
+    'chronograph_timer_wait_histogram',
+    'Time between an auction timer and its claim, by the timer priority',
+    ['priority'],
+    buckets=(.1, .25, .5, 1, 2, 5, 10, 30, 60, 120, 300),
+    registry=registry,
+)
+chronograph_claim_time_summary = prometheus_client.Summary(
+    'chronograph_claim_time_summary',
+    'Time taken to lease a batch of expired timers',
+    registry=registry,
+)
+chronograph_claim_batch_size_histogram = prometheus_client.Histogram(
+    'chronograph_claim_batch_size_histogram',
+    'Number of auctions leased by one claim',
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+    registry=registry,
+)
+chronograph_scheduler_timers_gauge = prometheus_client.Gauge(
+    'chronograph_scheduler_timers_gauge',
+    'Number of auction timers kept by the in-memory scheduler',
+    registry=registry,
+)
+chronograph_executor_queue_gauge = prometheus_client.Gauge(
+    'chronograph_executor_queue_gauge',
+    'Number of claimed auctions waiting for a free tick slot',
+    registry=registry,
+)
+chronograph_executor_in_progress_gauge = prometheus_client.Gauge(
+    'chronograph_executor_in_progress_gauge',
+    'Number of ticks in progress',
+    registry=registry,
+)
+chronograph_outbox_jobs_counter = prometheus_client.Counter(
+    'chronograph_outbox_jobs_counter',
+    'Number of processed outbox jobs publishing auction results',
+    ['status'],
+    registry=registry,
+)
+chronograph_outbox_jobs_per_claim_histogram = prometheus_client.Histogram(
+    'chronograph_outbox_jobs_per_claim_histogram',
+    'Number of outbox jobs of one tender published together',
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100),
+    registry=registry,
+)
+chronograph_stage_handler_time_histogram = prometheus_client.Histogram(
+    'chronograph_stage_handler_time_histogram',
+    'Time taken by a stage start/end handler',
+    ['event', 'stage_type'],
+    registry=registry,
+)
+chronograph_stage_handler_calls_counter = prometheus_client.Counter(
+    'chronograph_stage_handler_calls_counter',
+    'Number of stage start/end handler calls',
+    ['event', 'stage_type', 'status'],
+    registry=registry,
+)
+chronograph_http_connections_counter = prometheus_client.Counter(
+    'chronograph_http_connections_counter',
+    'Number of connections used by the http requests, new or reused from the pool',
+    ['host', 'connection'],
+    registry=registry,
+)
+chronograph_http_in_flight_gauge = prometheus_client.Gauge(
+    'chronograph_http_in_flight_gauge',
+    'Number of http requests in progress',
+    ['host'],
+    registry=registry,
+)
+chronograph_http_rate_gauge = prometheus_client.Gauge(
+    'chronograph_http_rate_gauge',
+    'Number of requests per second currently allowed by the rate limiter',
+    ['host'],
+    registry=registry,
+)
+chronograph_http_rate_wait_histogram = prometheus_client.Histogram(
+    'chronograph_http_rate_wait_histogram',
+    'Time a request has waited for the rate limiter',
+    ['host'],
+    buckets=(0, .01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60),
+    registry=registry,
+)
+chronograph_tender_cache_counter = prometheus_client.Counter(
+    'chronograph_tender_cache_counter',
+    'Number of tender api reads by the cache result: hit, revalidated (304) or miss',
+    ['path', 'result'],
+    registry=registry,
+)
+chronograph_lease_steals_counter = prometheus_client.Counter(
+    'chronograph_lease_steals_counter',
+    'Number of claimed auctions whose previous lease expired without being released',
+    registry=registry,
+)
+chronograph_lease_lost_counter = prometheus_client.Counter(
+    'chronograph_lease_lost_counter',
+    'Number of ticks that have lost their auction lease',
+    ['detected_by'],
+    registry=registry,
+)
+chronograph_buckets_gauge = prometheus_client.Gauge(
+    'chronograph_buckets_gauge',
+    'Number of auction buckets assigned to the replica',
+    registry=registry,
+)
 
 
 async def metrics(_):
@@ -1,43 +1,38 @@
 from yaml import dump
+try:
+    from yaml import CDumper as AuditDumper
+except ImportError:  # PyYAML is built without libyaml
+    from yaml import Dumper as AuditDumper
 from fractions import Fraction
 from prozorro_auction.utils.costs import (
     float as float_costs_utils,
     fraction as fraction_costs_utils,
 )
 from prozorro_auction.utils.base import get_now, datetime_to_str, copy_dict
+from prozorro_auction.utils.ranking import calculate_bid_sort_key
 from prozorro_auction.constants import AuctionType
 import logging
 
 
 logger = logging.getLogger(__name__)
 
+# sorted bids are kept on the auction during a tick, the key is not saved to the db
+SORTED_BIDS_KEY = "_sorted_bids"
 
-def sort_bids(bids):
+
+def sort_bids(bids, auction_type=None):
+    """
+    :param bids: auction bids
+    :param auction_type: AuctionType value of the auction, detected by the bids if not provided
+    :return: bids from the best to the worst
+    """
     is_esco = is_esco_bids(bids)
-    auction_type = get_bids_auction_type(bids)
-    if auction_type == AuctionType.MIXED:
-        def get_amount(b):
-            return b["amount_weighted"]
-    if auction_type == AuctionType.MEAT:
-        def get_amount(b):
-            return Fraction(b["amount_features"])
-    elif auction_type == AuctionType.LCC:
-        if is_esco:
-            raise NotImplementedError()
-        else:
-            def get_amount(b):
-                return b["amount_weighted"]
-    else:
-        if is_esco:
-            def get_amount(b):
-                return Fraction(b["value"]["amountPerformance"])
-        else:
-            def get_amount(b):
-                return b["value"]["amount"]
+    if auction_type is None:
+        auction_type = get_bids_auction_type(bids).value
     result = sorted(
         bids,
         key=lambda b: (
-            get_amount(b),
+            get_bid_sort_key(b, auction_type),
             b["date"]
         ),
         reverse=not is_esco
@@ -45,6 +40,13 @@ def sort_bids(bids):
     return result
 
 
+def get_bid_sort_key(bid, auction_type):
+    sort_key = bid.get("sort_key")
+    if sort_key is None:  # bids imported before sort keys were saved
+        sort_key = calculate_bid_sort_key(bid, auction_type)
+    return sort_key
+
+
 def get_bid_auction_type(bid):
     if bid.get("amount_weighted") and (bid.get("addition") or bid.get("denominator")):
         return AuctionType.MIXED
@@ -87,25 +89,40 @@ def get_label_dict(n):
     )
 
 
-def get_bidder_number(uid, initial_bids):
+def get_sorted_bids(auction):
+    """
+    Bids are sorted once and the result is reused by the stage handlers of the tick,
+    until publish_bids_made_in_current_stage changes the bids
+    """
+    sorted_bids = auction.get(SORTED_BIDS_KEY)
+    if sorted_bids is None:
+        sorted_bids = auction[SORTED_BIDS_KEY] = sort_bids(auction["bids"], auction.get("auction_type"))
+    return sorted_bids
+
+
+def get_bidder_numbers(initial_bids):
+    """
+    :return: {bidder_id: its number in initial_bids}, so labels are found without scanning the list
+    """
+    numbers = {}
     for n, bid in enumerate(initial_bids):
-        if bid["bidder_id"] == uid:
-            return n
+        numbers.setdefault(bid["bidder_id"], n)
+    return numbers
 
 
 def update_auction_results(auction):
     auction["results"] = []
-    for bid in sort_bids(auction["bids"]):
+    bidder_numbers = get_bidder_numbers(auction["initial_bids"])
+    for bid in get_sorted_bids(auction):
         result = {
-            "label": get_label_dict(
-                get_bidder_number(bid["id"], auction["initial_bids"])
-            )
+            "label": get_label_dict(bidder_numbers.get(bid["id"]))
         }
         copy_bid_stage_fields(bid, result)
         auction["results"].append(result)
 
 
 def publish_bids_made_in_current_stage(auction):
+    auction.pop(SORTED_BIDS_KEY, None)  # the bids are going to change
     current_stage = auction.get("current_stage")
     stage = auction["stages"][current_stage]
     stage["publish_time"] = get_now()
@@ -153,6 +170,7 @@ def publish_bids_made_in_current_stage(auction):
                                 denominator=bid.get("denominator", 1),
                                 addition=bid.get("addition", 0),
                             )
+                    bid["sort_key"] = calculate_bid_sort_key(bid, auction["auction_type"])
                     # TODO: maybe for MIXED should be updated
                     # update public stage fields
                     copy_bid_stage_fields(bid, stage)
@@ -314,7 +332,8 @@ def build_audit_document(auction):
                 timeline[label][f"turn_{turn}"]["denominator"] = stage.get("denominator")
 
     # safe_dump couldn't convert [<class 'bson.int64.Int64'>, 2238300000]
-    file_data = dump(audit, default_flow_style=False, encoding="utf-8", allow_unicode=True)
+    # the libyaml emitter produces the same output several times faster
+    file_data = dump(audit, Dumper=AuditDumper, default_flow_style=False, encoding="utf-8", allow_unicode=True)
     file_name = f"audit_{auction['_id']}.yaml"
     return file_name, file_data
 
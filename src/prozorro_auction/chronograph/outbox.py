@@ -0,0 +1,140 @@
+from prozorro_auction.chronograph.requests import get_tender_documents, get_tender_bids, get_session
+from prozorro_auction.chronograph.tasks import upload_audit_document, send_auction_results
+from prozorro_auction.chronograph.storage import (
+    read_auction,
+    PUBLISH_PROJECTION,
+    update_auction,
+    claim_outbox_job,
+    claim_tender_outbox_jobs,
+    postpone_outbox_job,
+    delete_outbox_job,
+    add_dead_letter,
+    PUBLICATION_DEAD_LETTER_STAGE,
+)
+from prozorro_auction.chronograph.metrics import (
+    chronograph_outbox_jobs_counter,
+    chronograph_outbox_jobs_per_claim_histogram,
+)
+from prozorro_auction.chronograph.settings import (
+    CHRONOGRAPH_OUTBOX_LOCK,
+    CHRONOGRAPH_OUTBOX_POLL_INTERVAL,
+    CHRONOGRAPH_OUTBOX_RETRY_BASE,
+    CHRONOGRAPH_OUTBOX_RETRY_MAX_DELAY,
+    CHRONOGRAPH_OUTBOX_MAX_ATTEMPTS,
+)
+from prozorro_auction.exceptions import RetryException
+from prozorro_auction.utils.base import get_backoff_delay
+from prozorro_auction.logging import log_context
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def publish_auction_results(session, auction):
+    """
+    1 upload audit document
+    2 send auction results to tenders api
+    every step is saved as done, so retries don't repeat it
+    """
+    if not auction.get("_audit_document_posted"):
+        # post audit document
+        tender_documents = await get_tender_documents(session, auction["tender_id"])  # public data
+        await upload_audit_document(session, auction, tender_documents)
+
+        await update_auction(
+            {"_id": auction["_id"], "_audit_document_posted": True},
+            update_date=False
+        )
+
+    if not auction.get("_auction_results_sent"):
+        # send results to the api
+        tender_bids = await get_tender_bids(session, auction["tender_id"])  # private data
+        await send_auction_results(session, auction, tender_bids)
+
+        await update_auction(
+            {"_id": auction["_id"], "_auction_results_sent": True},
+            update_date=False
+        )
+
+
+async def process_outbox_job(job):
+    with log_context(AUCTION_ID=job["_id"]):
+        try:
+            auction = await read_auction(job["_id"], projection=PUBLISH_PROJECTION)
+            if auction is None:
+                logger.error("Auction of the outbox job is not found",
+                             extra={"MESSAGE_ID": "CHRONOGRAPH_OUTBOX_AUCTION_NOT_FOUND"})
+            else:
+                await publish_auction_results(get_session(), auction)
+        except Exception as e:
+            if isinstance(e, RetryException):
+                logger.warning(e, extra={"MESSAGE_ID": "CHRONOGRAPH_OUTBOX_RETRY"})
+            else:
+                logger.exception(e, extra={"MESSAGE_ID": "CHRONOGRAPH_OUTBOX_EXCEPTION"})
+            attempts = job.get("attempts", 0) + 1
+            if attempts < CHRONOGRAPH_OUTBOX_MAX_ATTEMPTS:
+                delay = get_backoff_delay(attempts, CHRONOGRAPH_OUTBOX_RETRY_BASE, CHRONOGRAPH_OUTBOX_RETRY_MAX_DELAY)
+                log_method = logger.critical if delay >= CHRONOGRAPH_OUTBOX_RETRY_MAX_DELAY / 2 else logger.warning
+                log_method(f"Delaying publication of the auction results for {delay} seconds, attempt {attempts}",
+                           extra={"MESSAGE_ID": "CHRONOGRAPH_OUTBOX_POSTPONED"})
+                await postpone_outbox_job(job["_id"], delay, attempts, repr(e))
+                chronograph_outbox_jobs_counter.labels("failed").inc()
+            else:
+                dead_letter = {"_id": job["_id"], "chronograph_errors_count": attempts}
+                await add_dead_letter(dead_letter, PUBLICATION_DEAD_LETTER_STAGE, repr(e))
+                await delete_outbox_job(job["_id"])
+                logger.critical(f"Discarding publication of the auction results after {attempts} attempts, "
+                                f"see dead letters",
+                                extra={"MESSAGE_ID": "CHRONOGRAPH_DEAD_LETTER"})
+                chronograph_outbox_jobs_counter.labels("dead").inc()
+        else:
+            await delete_outbox_job(job["_id"])
+            chronograph_outbox_jobs_counter.labels("done").inc()
+
+
+async def process_outbox_jobs(jobs):
+    """
+    Jobs of the lots of one tender are published one after another,
+    the tender documents and bids are read once for all of them (see TENDER_CACHE)
+    and the api doesn't get concurrent changes of the tender.
+    A failed job is postponed on its own and doesn't stop the others
+    """
+    chronograph_outbox_jobs_per_claim_histogram.observe(len(jobs))
+    for job in jobs:
+        await process_outbox_job(job)
+
+
+class OutboxWorkers:
+    """
+    Publishes auction results saved to the outbox by the announcement stage.
+    These are slow requests to the document service and tenders api,
+    so they are done out of chronograph ticks and retried independently
+    """
+
+    def __init__(self, count):
+        self._count = count
+        self._tasks = []
+        self._keep_running = True
+
+    def start(self):
+        logger.info(f"Starting {self._count} outbox workers")
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self._count)]
+
+    async def stop(self):
+        """
+        Lets the workers finish their current jobs
+        """
+        self._keep_running = False
+        await asyncio.gather(*self._tasks)
+
+    async def _run(self):
+        while self._keep_running:
+            job = await claim_outbox_job(CHRONOGRAPH_OUTBOX_LOCK)
+            if job:
+                jobs = [job]
+                if job.get("lot_id"):
+                    jobs.extend(await claim_tender_outbox_jobs(job["tender_id"], CHRONOGRAPH_OUTBOX_LOCK))
+                await process_outbox_jobs(jobs)
+            else:
+                await asyncio.sleep(CHRONOGRAPH_OUTBOX_POLL_INTERVAL)
@@ -0,0 +1,58 @@
+from prozorro_auction.settings import CHRONOGRAPH_BUCKETS
+from prozorro_auction.chronograph.settings import CHRONOGRAPH_WORKER_ID, CHRONOGRAPH_MEMBERSHIP_INTERVAL
+from prozorro_auction.chronograph.storage import report_member, remove_member
+from prozorro_auction.chronograph.metrics import chronograph_buckets_gauge
+from pymongo.errors import PyMongoError
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def assign_buckets(members, worker_id, buckets_count=CHRONOGRAPH_BUCKETS):
+    """
+    Every n-th bucket goes to the n-th of the sorted replicas,
+    so all the replicas get the same split from the same list of members
+    """
+    if worker_id not in members:
+        return None
+    index = members.index(worker_id)
+    return [b for b in range(buckets_count) if b % len(members) == index]
+
+
+class Membership:
+    """
+    Keeps the replica registered in the members collection
+    and updates the buckets it should claim auctions from.
+    Claims stay atomic, so the replicas that have a bucket for a moment while rebalancing
+    only compete for its auctions as all of them did before partitioning
+    """
+
+    def __init__(self, worker_id=CHRONOGRAPH_WORKER_ID):
+        self.worker_id = worker_id
+        self.buckets = None  # all the buckets until the first report
+        self._keep_running = True
+
+    async def run(self):
+        while self._keep_running:
+            try:
+                members = await report_member(self.worker_id)
+            except PyMongoError as e:
+                logger.warning(f"Membership report error {type(e)}: {e}",
+                               extra={"MESSAGE_ID": "CHRONOGRAPH_MONGODB_EXC"})
+            else:
+                buckets = assign_buckets(members, self.worker_id)
+                if buckets != self.buckets:
+                    logger.info(f"Replica {self.worker_id} is assigned {len(buckets or ())} buckets "
+                                f"of {len(members)} replicas",
+                                extra={"MESSAGE_ID": "CHRONOGRAPH_BUCKETS_ASSIGNED"})
+                    self.buckets = buckets
+                    chronograph_buckets_gauge.set(len(buckets) if buckets is not None else CHRONOGRAPH_BUCKETS)
+            await asyncio.sleep(CHRONOGRAPH_MEMBERSHIP_INTERVAL)
+
+    async def leave(self):
+        """
+        Lets the other replicas take the buckets without waiting for the membership ttl
+        """
+        self._keep_running = False
+        await remove_member(self.worker_id)
@@ -1,17 +1,103 @@
-from prozorro_auction.settings import DS_URL, DS_HEADERS, CONNECTION_ERROR_INTERVAL
+from prozorro_auction.settings import DS_URL, DS_HEADERS, API_HEADERS, CONNECTION_ERROR_INTERVAL
+from prozorro_auction.chronograph.settings import (
+    CHRONOGRAPH_HTTP_LIMIT,
+    CHRONOGRAPH_HTTP_LIMIT_PER_HOST,
+    CHRONOGRAPH_HTTP_DNS_CACHE_TTL,
+    CHRONOGRAPH_HTTP_KEEPALIVE_TIMEOUT,
+    CHRONOGRAPH_HTTP_TIMEOUT,
+    CHRONOGRAPH_HTTP_CONNECT_TIMEOUT,
+)
+from prozorro_auction.chronograph.metrics import (
+    chronograph_http_connections_counter,
+    chronograph_http_in_flight_gauge,
+)
+from prozorro_auction.chronograph.cache import TenderCache
+from prozorro_auction.chronograph.limiter import get_rate_limiter, get_retry_after
 from prozorro_auction.exceptions import RequestRetryException, RetryException
 from json.decoder import JSONDecodeError
+from io import BytesIO
 from prozorro_auction.base_requests import request_tender
 import aiohttp
 import logging
 
 logger = logging.getLogger(__name__)
 
+SESSION = None
+TENDER_CACHE = TenderCache()  # lot auctions of a tender usually publish their results at the same time
+
+
+# SESSION
+async def on_request_start(session, ctx, params):
+    ctx.host = params.url.host
+    # the hooks are awaited by the session, so every api and document service request waits for its turn here
+    await get_rate_limiter(ctx.host).acquire()
+    chronograph_http_in_flight_gauge.labels(ctx.host).inc()
+
+
+async def on_request_end(session, ctx, params):
+    get_rate_limiter(ctx.host).on_response(params.response.status, get_retry_after(params.response.headers))
+    chronograph_http_in_flight_gauge.labels(ctx.host).dec()
+
+
+async def on_request_exception(session, ctx, params):
+    chronograph_http_in_flight_gauge.labels(ctx.host).dec()
+
+
+async def on_connection_create_end(session, ctx, params):
+    chronograph_http_connections_counter.labels(ctx.host, "new").inc()
+
+
+async def on_connection_reuseconn(session, ctx, params):
+    chronograph_http_connections_counter.labels(ctx.host, "reused").inc()
+
+
+def get_trace_config():
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    return trace_config
+
+
+def get_session():
+    """
+    A process-wide client session, so the connections to the api and document service
+    are kept alive and reused by the requests
+    """
+    global SESSION
+    if SESSION is None or SESSION.closed:
+        connector = aiohttp.TCPConnector(
+            limit=CHRONOGRAPH_HTTP_LIMIT,
+            limit_per_host=CHRONOGRAPH_HTTP_LIMIT_PER_HOST,
+            ttl_dns_cache=CHRONOGRAPH_HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=CHRONOGRAPH_HTTP_KEEPALIVE_TIMEOUT,
+        )
+        SESSION = aiohttp.ClientSession(
+            connector=connector,
+            headers=API_HEADERS,
+            timeout=aiohttp.ClientTimeout(
+                total=CHRONOGRAPH_HTTP_TIMEOUT,
+                connect=CHRONOGRAPH_HTTP_CONNECT_TIMEOUT,
+            ),
+            trace_configs=[get_trace_config()],
+        )
+    return SESSION
+
+
+async def close_session():
+    global SESSION
+    if SESSION is not None:
+        await SESSION.close()
+        SESSION = None
+
 
 # DS REQUESTS
 async def upload_document(session, file_name, data):
     form_data = aiohttp.FormData()
-    form_data.add_field("file", data, filename=file_name)
+    # a file object is sent by chunks instead of being copied to the request at once
+    form_data.add_field("file", BytesIO(data), filename=file_name, content_type="application/octet-stream")
     while True:
         try:
             resp = await session.post(DS_URL, data=form_data, headers=DS_HEADERS)
@@ -41,12 +127,13 @@ async def upload_document(session, file_name, data):
 
 # TENDER REQUESTS
 async def get_tender_documents(session, tender_id):
-    data = await request_tender(session, tender_id)
+    data = await TENDER_CACHE.get(session, tender_id)
     return data.get("documents", "")
 
 
 async def get_tender_bids(session, tender_id):
-    data = await request_tender(session, tender_id, url_suffix="/auction")
+    # lot results don't change the bid ids and lots used to build the patches of the other lots
+    data = await TENDER_CACHE.get(session, tender_id, url_suffix="/auction")
     return data.get("bids", "")
 
 
@@ -63,4 +150,13 @@ async def publish_tender_document(session, tender_id, data, doc_id=None):
     else:
         method_name = "post"
         url_suffix = "/documents"
-    return await request_tender(session, tender_id, dict(data=data), url_suffix=url_suffix, method_name=method_name)
+    result = await request_tender(session, tender_id, dict(data=data), url_suffix=url_suffix, method_name=method_name)
+    # the other lots of the tender keep using the cached documents, a retry of this one finds the document id there
+    TENDER_CACHE.update(tender_id, lambda tender: add_tender_document(tender, result))
+    return result
+
+
+def add_tender_document(tender, document):
+    documents = [d for d in tender.get("documents", []) if d["id"] != document["id"]]
+    documents.append(document)
+    return dict(tender, documents=documents)
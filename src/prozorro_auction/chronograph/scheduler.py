@@ -0,0 +1,147 @@
+from prozorro_auction.storage import get_mongodb_collection
+from prozorro_auction.settings import MONGODB_ERROR_INTERVAL
+from prozorro_auction.chronograph.settings import CHRONOGRAPH_POLL_INTERVAL, CHRONOGRAPH_SCHEDULER_MAX_SLEEP
+from prozorro_auction.chronograph.metrics import chronograph_scheduler_timers_gauge
+from pymongo.errors import PyMongoError
+from heapq import heappush, heappop, heapify
+from time import time
+import asyncio
+import logging
+import pytz
+
+logger = logging.getLogger(__name__)
+
+
+# only the changes of "timer" field are interesting for the scheduler
+TIMER_CHANGES_PIPELINE = [
+    {
+        "$match": {
+            "$or": [
+                {"operationType": {"$in": ["insert", "replace", "delete"]}},
+                {"updateDescription.updatedFields.timer": {"$exists": True}},
+                {"updateDescription.removedFields": "timer"},
+            ]
+        }
+    },
+    {
+        "$project": {
+            "operationType": 1,
+            "documentKey": 1,
+            "fullDocument.timer": 1,
+            "updateDescription.updatedFields.timer": 1,
+            "updateDescription.removedFields": 1,
+        }
+    },
+]
+
+
+def timer_to_timestamp(timer):
+    # timers are stored as naive utc datetime objects
+    return pytz.utc.localize(timer).timestamp()
+
+
+class TimerScheduler:
+    """
+    Keeps timers of the auctions in an in-memory heap
+    and wakes chronograph loop up exactly when the earliest of them expires.
+    The heap is loaded from the db and then kept up to date by the change stream of the "timer" field.
+    Auctions are still claimed by the atomic db update, so the scheduler only decides when to try.
+    If the change stream drops, the scheduler falls back to polling until it is restored.
+    """
+
+    def __init__(self):
+        self._timers = {}  # auction_id -> timestamp
+        self._heap = []  # (timestamp, auction_id), may contain outdated entries
+        self._changed = asyncio.Event()
+        self._is_watching = False
+        self._woken_for = None
+
+    def set_timer(self, auction_id, timer):
+        if timer is None:
+            self._timers.pop(auction_id, None)
+        else:
+            timestamp = timer_to_timestamp(timer)
+            self._timers[auction_id] = timestamp
+            heappush(self._heap, (timestamp, auction_id))
+            if self._heap[0][0] == timestamp:  # the earliest timer has changed
+                self._changed.set()
+        chronograph_scheduler_timers_gauge.set(len(self._timers))
+
+    def wake(self):
+        self._changed.set()
+
+    def get_next_timestamp(self):
+        while self._heap:
+            timestamp, auction_id = self._heap[0]
+            if self._timers.get(auction_id) == timestamp:
+                return timestamp
+            heappop(self._heap)  # the timer has been changed or removed since
+
+    async def wait(self):
+        """
+        Returns when it's time to claim expired timers
+        """
+        if not self._is_watching:
+            return await asyncio.sleep(CHRONOGRAPH_POLL_INTERVAL)
+
+        timeout = CHRONOGRAPH_SCHEDULER_MAX_SLEEP
+        timestamp = self.get_next_timestamp()
+        if timestamp is not None:
+            delay = timestamp - time()
+            if delay <= 0:
+                if timestamp != self._woken_for:
+                    self._woken_for = timestamp
+                    return
+                # nothing has been claimed for this timer (another replica has got it),
+                # so we wait until its change comes from the stream
+                timeout = CHRONOGRAPH_POLL_INTERVAL
+            else:
+                timeout = min(delay, timeout)
+
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _load(self, auctions):
+        self._timers = {a["_id"]: timer_to_timestamp(a["timer"]) for a in auctions if a.get("timer")}
+        self._heap = [(timestamp, auction_id) for auction_id, timestamp in self._timers.items()]
+        heapify(self._heap)
+        chronograph_scheduler_timers_gauge.set(len(self._timers))
+        self._changed.set()
+
+    def _apply_change(self, change):
+        operation_type = change["operationType"]
+        auction_id = change["documentKey"]["_id"]
+        if operation_type in ("insert", "replace"):
+            self.set_timer(auction_id, change["fullDocument"].get("timer"))
+        elif operation_type == "update":
+            self.set_timer(auction_id, change["updateDescription"]["updatedFields"].get("timer"))
+        elif operation_type == "delete":
+            self.set_timer(auction_id, None)
+
+    async def run(self):
+        collection = get_mongodb_collection()
+        while True:
+            try:
+                async with collection.watch(TIMER_CHANGES_PIPELINE) as changes:
+                    # the stream is opened before the timers are read, so no change is missed
+                    first_change = await changes.try_next()
+                    cursor = collection.find({"timer": {"$exists": True}}, projection=("timer",))
+                    self._load(await cursor.to_list(length=None))
+                    self._is_watching = True
+                    logger.info(f"Scheduler has loaded {len(self._timers)} timers")
+                    if first_change:
+                        self._apply_change(first_change)
+                    async for change in changes:
+                        self._apply_change(change)
+            except PyMongoError as e:
+                logger.warning(f"Scheduler watch error {type(e)}: {e}",
+                               extra={"MESSAGE_ID": "CHRONOGRAPH_MONGODB_EXC"})
+            except Exception as e:
+                logger.exception(e, extra={"MESSAGE_ID": "CHRONOGRAPH_SCHEDULER_EXCEPTION"})
+            if self._is_watching:
+                logger.warning("Scheduler falls back to polling")
+                self._is_watching = False
+            await asyncio.sleep(MONGODB_ERROR_INTERVAL)
@@ -0,0 +1,77 @@
+from prozorro_auction.settings import PROCESSING_LOCK
+import socket
+import os
+
+
+# identity of this chronograph process, is used to tag the leased auctions
+CHRONOGRAPH_WORKER_ID = os.environ.get("CHRONOGRAPH_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+# max number of expired timers leased by one claim (1 means one find_one_and_update per auction)
+CHRONOGRAPH_BATCH_SIZE = int(os.environ.get("CHRONOGRAPH_BATCH_SIZE", 1))
+# max number of ticks processed concurrently
+CHRONOGRAPH_CONCURRENCY = int(os.environ.get("CHRONOGRAPH_CONCURRENCY", 1))
+# max number of claimed auctions waiting for a free tick slot
+CHRONOGRAPH_QUEUE_SIZE = int(os.environ.get("CHRONOGRAPH_QUEUE_SIZE", 0))
+
+# claimed auctions are leased for this number of seconds, it replaces PROCESSING_LOCK for the chronograph
+# (a longer PROCESSING_LOCK is still used). A worker that has stopped holds its auctions up to this time
+CHRONOGRAPH_LEASE = float(os.environ.get("CHRONOGRAPH_LEASE", max(PROCESSING_LOCK, 15)))
+# a running tick renews its lease every third of the lease, but not more often than this number of seconds
+# (and at least twice per lease), so most ticks finish without renewals
+CHRONOGRAPH_LEASE_MIN_RENEW_INTERVAL = float(os.environ.get("CHRONOGRAPH_LEASE_MIN_RENEW_INTERVAL", 5))
+CHRONOGRAPH_LEASE_RENEW_INTERVAL = min(
+    max(CHRONOGRAPH_LEASE / 3, CHRONOGRAPH_LEASE_MIN_RENEW_INTERVAL),
+    CHRONOGRAPH_LEASE / 2,
+)
+
+# "poll" - look for expired timers every CHRONOGRAPH_POLL_INTERVAL seconds when there is nothing to do
+# "watch" - keep timers in memory by watching their changes and wake up exactly at the earliest one
+CHRONOGRAPH_SCHEDULER = os.environ.get("CHRONOGRAPH_SCHEDULER", "poll")
+CHRONOGRAPH_POLL_INTERVAL = float(os.environ.get("CHRONOGRAPH_POLL_INTERVAL", 1))
+# "watch" mode still checks the db at least this often
+CHRONOGRAPH_SCHEDULER_MAX_SLEEP = float(os.environ.get("CHRONOGRAPH_SCHEDULER_MAX_SLEEP", 60))
+
+# number of workers publishing auction results from the outbox (0 - this replica doesn't publish them)
+CHRONOGRAPH_OUTBOX_WORKERS = int(os.environ.get("CHRONOGRAPH_OUTBOX_WORKERS", 2))
+# number of seconds to protect a claimed outbox job from other workers
+CHRONOGRAPH_OUTBOX_LOCK = float(os.environ.get("CHRONOGRAPH_OUTBOX_LOCK", 2 * 60))
+CHRONOGRAPH_OUTBOX_POLL_INTERVAL = float(os.environ.get("CHRONOGRAPH_OUTBOX_POLL_INTERVAL", 1))
+# failed jobs are retried with exponential backoff starting with the base delay
+CHRONOGRAPH_OUTBOX_RETRY_BASE = float(os.environ.get("CHRONOGRAPH_OUTBOX_RETRY_BASE", 1))
+CHRONOGRAPH_OUTBOX_RETRY_MAX_DELAY = float(os.environ.get("CHRONOGRAPH_OUTBOX_RETRY_MAX_DELAY", 10 * 60))
+# after this number of failed attempts the job is moved to the dead letters
+CHRONOGRAPH_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("CHRONOGRAPH_OUTBOX_MAX_ATTEMPTS", 20))
+# lot jobs are delayed for this number of seconds, so the lots of a tender finished together are published together
+CHRONOGRAPH_OUTBOX_COALESCE_WINDOW = float(os.environ.get("CHRONOGRAPH_OUTBOX_COALESCE_WINDOW", 5))
+
+# shared http client of the api and document service requests
+CHRONOGRAPH_HTTP_LIMIT = int(os.environ.get("CHRONOGRAPH_HTTP_LIMIT", 100))
+CHRONOGRAPH_HTTP_LIMIT_PER_HOST = int(os.environ.get("CHRONOGRAPH_HTTP_LIMIT_PER_HOST", 20))
+CHRONOGRAPH_HTTP_DNS_CACHE_TTL = int(os.environ.get("CHRONOGRAPH_HTTP_DNS_CACHE_TTL", 5 * 60))
+CHRONOGRAPH_HTTP_KEEPALIVE_TIMEOUT = float(os.environ.get("CHRONOGRAPH_HTTP_KEEPALIVE_TIMEOUT", 60))
+CHRONOGRAPH_HTTP_TIMEOUT = float(os.environ.get("CHRONOGRAPH_HTTP_TIMEOUT", 5 * 60))
+CHRONOGRAPH_HTTP_CONNECT_TIMEOUT = float(os.environ.get("CHRONOGRAPH_HTTP_CONNECT_TIMEOUT", 30))
+# requests per second to every host, the rate grows by about CHRONOGRAPH_HTTP_RATE_INCREASE every second
+# of successful requests and is multiplied by CHRONOGRAPH_HTTP_RATE_DECREASE on 429 and 5xx responses
+CHRONOGRAPH_HTTP_RATE = float(os.environ.get("CHRONOGRAPH_HTTP_RATE", 20))
+CHRONOGRAPH_HTTP_MIN_RATE = float(os.environ.get("CHRONOGRAPH_HTTP_MIN_RATE", 1))
+CHRONOGRAPH_HTTP_MAX_RATE = float(os.environ.get("CHRONOGRAPH_HTTP_MAX_RATE", 100))
+CHRONOGRAPH_HTTP_RATE_INCREASE = float(os.environ.get("CHRONOGRAPH_HTTP_RATE_INCREASE", 1))
+CHRONOGRAPH_HTTP_RATE_DECREASE = float(os.environ.get("CHRONOGRAPH_HTTP_RATE_DECREASE", 0.5))
+
+# tender api responses are shared by lot auctions for CHRONOGRAPH_TENDER_CACHE_TTL seconds
+# and revalidated with their ETag until CHRONOGRAPH_TENDER_CACHE_MAX_AGE
+CHRONOGRAPH_TENDER_CACHE_TTL = float(os.environ.get("CHRONOGRAPH_TENDER_CACHE_TTL", 30))
+CHRONOGRAPH_TENDER_CACHE_MAX_AGE = float(os.environ.get("CHRONOGRAPH_TENDER_CACHE_MAX_AGE", 5 * 60))
+
+# failing ticks are retried with exponential backoff starting with the base delay
+CHRONOGRAPH_RETRY_BASE = float(os.environ.get("CHRONOGRAPH_RETRY_BASE", 1))
+CHRONOGRAPH_RETRY_MAX_DELAY = float(os.environ.get("CHRONOGRAPH_RETRY_MAX_DELAY", 5 * 60))
+# after this number of failed ticks in a row the auction is moved to the dead letters
+CHRONOGRAPH_MAX_ERRORS = int(os.environ.get("CHRONOGRAPH_MAX_ERRORS", 20))
+
+# every replica claims only the auctions of its buckets, the buckets are rebalanced when replicas join or leave
+CHRONOGRAPH_PARTITIONING = bool(os.environ.get("CHRONOGRAPH_PARTITIONING", False))
+# replicas report they are alive this often and are considered gone after the ttl
+CHRONOGRAPH_MEMBERSHIP_INTERVAL = float(os.environ.get("CHRONOGRAPH_MEMBERSHIP_INTERVAL", 5))
+CHRONOGRAPH_MEMBERSHIP_TTL = float(os.environ.get("CHRONOGRAPH_MEMBERSHIP_TTL", 30))
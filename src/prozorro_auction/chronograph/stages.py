@@ -1,15 +1,13 @@
-from prozorro_auction.settings import API_HEADERS
 from datetime import datetime, timedelta
-from prozorro_auction.chronograph.requests import get_tender_documents, get_tender_bids
-from prozorro_auction.chronograph.tasks import upload_audit_document, send_auction_results
-from prozorro_auction.chronograph.storage import update_auction
-from prozorro_auction.utils.base import get_now
+from prozorro_auction.chronograph.handlers import (
+    on_stage_start, on_stage_end, run_stage_handler, STAGE_START, STAGE_END,
+)
 from prozorro_auction.chronograph.model import (
-    sort_bids, get_label_dict, get_bidder_number, update_auction_results,
+    get_sorted_bids, get_label_dict, get_bidder_numbers, update_auction_results,
     publish_bids_made_in_current_stage, copy_bid_stage_fields,
 )
 from prozorro_auction.settings import LATENCY_TIME
-import aiohttp
+from prozorro_auction.constants import TIMER_PRIORITIES
 import logging
 
 logger = logging.getLogger(__name__)
@@ -45,6 +43,7 @@ async def tick_auction(auction):
     next_stage = auction["current_stage"] + 1
     if next_stage < len(stages):
         auction["timer"] = stages[next_stage]["start"]
+        auction["timer_priority"] = TIMER_PRIORITIES.get(stages[next_stage]["type"], 0)
     else:
         auction["timer"] = None
 
@@ -56,26 +55,23 @@ async def run_stage_methods(auction, stages, current_stage):
        current_stage != finished_stage:  # to run "on_end" methods only once in case of any exceptions after their run
 
         this_stage = stages[current_stage]
-        end_method = globals().get(f"on_end_stage_{this_stage['type']}")
-        if end_method:
-            await end_method(auction)
+        await run_stage_handler(STAGE_END, this_stage["type"], auction)
 
         auction["finished_stage"] = current_stage
 
     # start next stage method
     next_stage = stages[current_stage + 1]
-    start_method = globals().get(f"on_start_stage_{next_stage['type']}")
-    if start_method:
-        await start_method(auction)
+    await run_stage_handler(STAGE_START, next_stage["type"], auction)
 
 
+@on_stage_start("pause")
 async def on_start_stage_pause(auction):
     current_stage = auction.get("current_stage", -1)
     # set initial_bids
     if current_stage == -1:
         logger.info("Set initial bids")
         auction["initial_bids"] = []
-        for n, bid in enumerate(sort_bids(auction["bids"])):
+        for n, bid in enumerate(get_sorted_bids(auction)):
             initial_bid = dict(label=get_label_dict(n))
             copy_bid_stage_fields(bid, initial_bid)
             auction["initial_bids"].append(initial_bid)
@@ -87,16 +83,16 @@ async def on_start_stage_pause(auction):
     stages = auction.get("stages")
     index = current_stage + 2
     logger.info(f"Set {index}:{index + len(auction['bids'])} bid stages order")
-    for i, bid in enumerate(sort_bids(auction["bids"])):
+    bidder_numbers = get_bidder_numbers(auction["initial_bids"])
+    for i, bid in enumerate(get_sorted_bids(auction)):
         bid_stage = dict(
-            label=get_label_dict(
-                get_bidder_number(bid["id"], auction["initial_bids"])
-            )
+            label=get_label_dict(bidder_numbers.get(bid["id"]))
         )
         copy_bid_stage_fields(bid, bid_stage)
         stages[index + i].update(bid_stage)
 
 
+@on_stage_end("bids")
 async def on_end_stage_bids(auction):
     """
     copy posted bid to "bids" field
@@ -105,35 +101,17 @@ async def on_end_stage_bids(auction):
     update_auction_results(auction)
 
 
+@on_stage_start("pre_announcement")
 async def on_start_stage_pre_announcement(auction):
     pass   # i don't want run long running tasks here, as it would delay finishing of the last bid stage
 
 
-POSTPONE_ANNOUNCEMENT_TD = timedelta(seconds=2 * 60)
-
-
+@on_stage_start("announcement")
 async def on_start_stage_announcement(auction):
     """
-    1 upload audit document
-    2 send auction results to tenders api
+    audit document upload and sending results to tenders api take seconds,
+    so they are saved as an outbox job and done by the outbox workers.
+    The job is added after the tick is saved (see process_auction),
+    the workers publish the saved results only
     """
-    # increase timer as this task usually takes more than 2 sec
-    await update_auction(
-        {"_id": auction["_id"], "timer": get_now() + POSTPONE_ANNOUNCEMENT_TD},
-        update_date=False
-    )
-
-    async with aiohttp.ClientSession(headers=API_HEADERS) as session:
-        if not auction.get("_audit_document_posted"):
-            # post audit document
-            tender_documents = await get_tender_documents(session, auction["tender_id"])  # public data
-            await upload_audit_document(session, auction, tender_documents)
-
-            await update_auction(
-                {"_id": auction["_id"], "_audit_document_posted": True},
-                update_date=False
-            )
-
-        # send results to the api
-        tender_bids = await get_tender_bids(session, auction["tender_id"])  # private data
-        await send_auction_results(session, auction, tender_bids)
+    auction["add_outbox_job"] = True
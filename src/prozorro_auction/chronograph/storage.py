@@ -1,17 +1,39 @@
-from prozorro_auction.storage import get_mongodb_collection
+from prozorro_auction.storage import get_mongodb_collection, codec_options
 from prozorro_auction.settings import PROCESSING_LOCK, MONGODB_ERROR_INTERVAL
+from prozorro_auction.chronograph.settings import (
+    CHRONOGRAPH_WORKER_ID,
+    CHRONOGRAPH_MEMBERSHIP_TTL,
+    CHRONOGRAPH_OUTBOX_COALESCE_WINDOW,
+)
+from prozorro_auction.chronograph.metrics import (
+    chronograph_save_bytes_summary,
+    chronograph_lease_steals_counter,
+    chronograph_lease_lost_counter,
+    chronograph_timer_wait_histogram,
+)
 from prozorro_auction.utils.base import get_now
 from pymongo.errors import PyMongoError
 from pymongo.collection import ReturnDocument
+from pymongo import ASCENDING
+from bson import encode
 from datetime import timedelta
+from copy import deepcopy
+from uuid import uuid4
 import asyncio
 import logging
+import pytz
 
 logger = logging.getLogger(__name__)
+OUTBOX_COLLECTION = "chronograph_outbox"
+DEAD_LETTERS_COLLECTION = "chronograph_dead_letters"
+MEMBERS_COLLECTION = "chronograph_members"
+# stage of the dead letters of the outbox jobs, they are requeued to the outbox
+PUBLICATION_DEAD_LETTER_STAGE = "publication"
 UPDATE_CHRONOGRAPH_FIELDS = (
     "current_stage",
     "finished_stage",
     "timer",
+    "timer_priority",
     "chronograph_errors_count",
     "stages",
     "initial_bids",
@@ -20,39 +42,252 @@ UPDATE_CHRONOGRAPH_FIELDS = (
     "_audit_document_posted",
     "_auction_results_sent",
 )
+# bid fields used to sort, publish and report the bids
+BID_FIELDS = (
+    "id",
+    "date",
+    "value",
+    "stages",
+    "amount_features",
+    "coeficient",
+    "amount_weighted",
+    "non_price_cost",
+    "denominator",
+    "addition",
+    "sort_key",
+)
+# heavy fields like "items", "features", "criteria" and bidders' "parameters" are never read by ticks
+TICK_PROJECTION = {
+    "current_stage": 1,
+    "finished_stage": 1,
+    "timer": 1,
+    "timer_priority": 1,
+    "chronograph_errors_count": 1,
+    "lease_owner": 1,
+    "stages": 1,
+    "initial_bids": 1,
+    "results": 1,
+    "auction_type": 1,
+    "tender_id": 1,
+    "lot_id": 1,
+    **{f"bids.{f}": 1 for f in BID_FIELDS},
+}
+# fields used by the audit document and the results sent to the api
+PUBLISH_PROJECTION = {
+    "tenderID": 1,
+    "tender_id": 1,
+    "lot_id": 1,
+    "start_at": 1,
+    "auction_type": 1,
+    "stages": 1,
+    "initial_bids": 1,
+    "_audit_document_posted": 1,
+    "_auction_results_sent": 1,
+    **{f"bids.{f}": 1 for f in BID_FIELDS},
+}
+
+
+def new_lease_owner():
+    return f"{CHRONOGRAPH_WORKER_ID}:{uuid4().hex}"
+
+
+def get_lease_until(current_ts, lock):
+    # mongodb returns naive utc datetime objects, the claimed auctions get the same
+    return (current_ts + timedelta(seconds=lock)).astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def get_expired_filter(current_ts, buckets=None):
+    expired_filter = {'timer': {'$exists': True, '$lte': current_ts}}
+    if buckets is not None:
+        # auctions scheduled before partitioning have no bucket, every replica may claim them
+        expired_filter["bucket"] = {"$in": list(buckets) + [None]}
+    return expired_filter
+
+
+# bids and pause transitions go before announcements, see TIMER_PRIORITIES
+# auctions scheduled before the priorities have none and go first
+CLAIM_SORT = (("timer_priority", ASCENDING), ("timer", ASCENDING))
+
+
+def observe_timer_wait(auction, current_ts):
+    timer = auction.get("timer")
+    if timer:
+        wait = (current_ts - timer.replace(tzinfo=pytz.utc)).total_seconds()
+        chronograph_timer_wait_histogram.labels(auction.get("timer_priority", "none")).observe(max(wait, 0))
 
 
-async def increase_and_read_expired_timer():
+async def increase_and_read_expired_timer(lock=PROCESSING_LOCK, buckets=None):
     collection = get_mongodb_collection()
     while True:
         current_ts = get_now()
         # this is needed to guarantee that this object will not be touched by another chronograph
-        processing_lock = timedelta(seconds=PROCESSING_LOCK)
+        lease = {
+            "timer": get_lease_until(current_ts, lock),
+            "lease_owner": new_lease_owner(),
+            "lease_until": get_lease_until(current_ts, lock),
+        }
         try:
             auction = await collection.find_one_and_update(
-                {'timer': {'$exists': True, '$lte': current_ts}},
-                {'$set': {'timer': current_ts + processing_lock}},
-                return_document=ReturnDocument.AFTER
+                get_expired_filter(current_ts, buckets),
+                {'$set': lease},
+                projection=TICK_PROJECTION,
+                sort=CLAIM_SORT,
+                return_document=ReturnDocument.BEFORE  # to see if it has been leased by someone else
             )
         except PyMongoError as e:
             logger.warning(f"Read timer error {type(e)}: {e}",
                            extra={"MESSAGE_ID": "CHRONOGRAPH_MONGODB_EXC"})
             await asyncio.sleep(MONGODB_ERROR_INTERVAL)
         else:
+            if auction:
+                if auction.get("lease_owner"):
+                    chronograph_lease_steals_counter.inc()
+                observe_timer_wait(auction, current_ts)
+                auction.update(lease)
             return auction
 
 
-async def update_auction(data, update_date=True):
+async def claim_expired_timers(limit, lock=PROCESSING_LOCK, buckets=None):
+    """
+    Lease up to `limit` expired timers at once.
+    The candidates are tagged with a unique lease id by one update_many,
+    its filter repeats the timer condition, so an auction leased by another worker in the meantime is skipped.
+    Then only the auctions that got our lease are read back
+    :param limit: max number of auctions to lease
+    :param lock: number of seconds to protect the leased auctions from other workers
+    :param buckets: claim only the auctions of these buckets (None - all of them)
+    :return: list of auctions
+    """
+    collection = get_mongodb_collection()
+    while True:
+        current_ts = get_now()
+        expired_filter = get_expired_filter(current_ts, buckets)
+        lease_owner = new_lease_owner()
+        lease_until = get_lease_until(current_ts, lock)
+        try:
+            cursor = collection.find(
+                expired_filter,
+                projection=("_id", "lease_owner", "timer", "timer_priority"),
+                sort=CLAIM_SORT,
+                limit=limit,
+            )
+            candidates = {a["_id"]: a async for a in cursor}
+            if not candidates:
+                return []
+
+            await collection.update_many(
+                {"_id": {"$in": list(candidates)}, **expired_filter},
+                {'$set': {'timer': lease_until, 'lease_owner': lease_owner, 'lease_until': lease_until}},
+            )
+            auctions = await collection.find(
+                {"_id": {"$in": list(candidates)}, "lease_owner": lease_owner},
+                projection=TICK_PROJECTION,
+            ).to_list(length=None)
+        except PyMongoError as e:
+            logger.warning(f"Claim timers error {type(e)}: {e}",
+                           extra={"MESSAGE_ID": "CHRONOGRAPH_MONGODB_EXC"})
+            await asyncio.sleep(MONGODB_ERROR_INTERVAL)
+        else:
+            # a lease is released when the tick is saved, so an expired one has been lost by its owner
+            steals = sum(1 for a in auctions if candidates[a["_id"]].get("lease_owner"))
+            if steals:
+                chronograph_lease_steals_counter.inc(steals)
+            for auction in auctions:
+                observe_timer_wait(candidates[auction["_id"]], current_ts)
+            # the executor starts the ticks in the claim order
+            order = {auction_id: n for n, auction_id in enumerate(candidates)}
+            auctions.sort(key=lambda a: order[a["_id"]])
+            return auctions
+
+
+async def extend_lease(auction_id, lease_owner, lock=PROCESSING_LOCK):
+    """
+    Moves the lease (and the timer that protects the auction from other workers) forward
+    :return: False if the lease has been lost
+    """
+    collection = get_mongodb_collection()
+    lease_until = get_lease_until(get_now(), lock)
+    try:
+        result = await collection.update_one(
+            {"_id": auction_id, "lease_owner": lease_owner},
+            {"$set": {"timer": lease_until, "lease_until": lease_until}},
+        )
+    except PyMongoError as e:
+        logger.warning(f"Extend lease error {type(e)}: {e}",
+                       extra={"MESSAGE_ID": "CHRONOGRAPH_MONGODB_EXC"})
+        return True  # the next heartbeat will try again
+    return result.matched_count > 0
+
+
+def copy_update_fields(auction):
+    """
+    A snapshot of the fields chronograph may change,
+    it's compared with the auction after its tick to save only the changes
+    """
+    return deepcopy({k: v for k, v in auction.items() if k in UPDATE_CHRONOGRAPH_FIELDS})
+
+
+def collect_changes(path, old, new, set_data, unset_data):
+    """
+    Dicts and lists of the same length are compared item by item,
+    so e.g. a changed stage is saved as "stages.5.amount" instead of the whole "stages" list
+    """
+    if type(old) is type(new) and old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key, value in new.items():
+            if key in old:
+                collect_changes(f"{path}.{key}", old[key], value, set_data, unset_data)
+            else:
+                set_data[f"{path}.{key}"] = value
+        for key in old.keys() - new.keys():
+            unset_data[f"{path}.{key}"] = ""
+    elif isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        for n, (old_item, new_item) in enumerate(zip(old, new)):
+            collect_changes(f"{path}.{n}", old_item, new_item, set_data, unset_data)
+    else:
+        set_data[path] = new
+
+
+def get_auction_changes(original, data):
+    set_data, unset_data = {}, {}
+    for key, value in data.items():
+        if key in original:
+            collect_changes(key, original[key], value, set_data, unset_data)
+        else:
+            set_data[key] = value
+    return set_data, unset_data
+
+
+async def update_auction(data, update_date=True, original=None, lease_owner=None):
+    """
+    :param data: auction fields to save
+    :param update_date: update "modified" field
+    :param original: snapshot of the auction fields (see copy_update_fields),
+    if provided only the changed paths are saved
+    :param lease_owner: the auction is saved only if it's still leased by this owner, the lease is released
+    :return:
+    """
     collection = get_mongodb_collection()
     set_data = {k: v for k, v in data.items() if k in UPDATE_CHRONOGRAPH_FIELDS}
+    unset_data = {}
     update = {}
 
+    if original is not None:
+        set_data, unset_data = get_auction_changes(original, set_data)
+
     if update_date:
         update["$currentDate"] = {"modified": True}
 
     if "timer" in set_data and set_data["timer"] is None:
         del set_data["timer"]
-        update["$unset"] = {"timer": ""}
+        unset_data["timer"] = ""
+
+    if lease_owner is not None:
+        unset_data.update(lease_owner="", lease_until="")
+
+    if unset_data:
+        update["$unset"] = unset_data
 
     if set_data:
         update["$set"] = set_data
@@ -61,17 +296,265 @@ async def update_auction(data, update_date=True):
         logger.critical(f"There is nothing to update: {data}")
         return
 
+    if original is not None:
+        chronograph_save_bytes_summary.observe(len(encode(update, codec_options=codec_options)))
+
+    query = {"_id": data["_id"]}
+    if lease_owner is not None:
+        query["lease_owner"] = lease_owner
+
     retries = 0
     while True:
         try:
             result = await collection.update_one(
-                {"_id": data["_id"]},
+                query,
                 update,
                 upsert=False
             )
+            if lease_owner is not None and result.matched_count == 0:
+                chronograph_lease_lost_counter.labels("save").inc()
+                logger.critical("Auction lease has been lost, the tick results are discarded",
+                                extra={"MESSAGE_ID": "CHRONOGRAPH_LEASE_LOST"})
             return result
         except PyMongoError as e:
             log_method = getattr(logger, "critical" if retries > 3 else "warning")
             log_method(f"Save auction error {type(e)}: {e}", extra={"MESSAGE_ID": "CHRONOGRAPH_MONGODB_EXC"})
             await asyncio.sleep(MONGODB_ERROR_INTERVAL)
             retries += 1
+
+
+async def prepare_storage():
+    indexes = (
+        (OUTBOX_COLLECTION, {"keys": [("run_at", ASCENDING)]}),
+        (OUTBOX_COLLECTION, {"keys": [("tender_id", ASCENDING), ("run_at", ASCENDING)]}),
+        # members that haven't reported for a long time are removed
+        (MEMBERS_COLLECTION, {"keys": [("heartbeat", ASCENDING)], "expireAfterSeconds": 24 * 3600}),
+    )
+    for collection_name, index in indexes:
+        collection = get_mongodb_collection(collection_name)
+        while True:
+            try:
+                r = await collection.create_index(**index, background=True)
+            except PyMongoError as e:
+                logger.warning(f"Prep storage {type(e)}: {e}", extra={"MESSAGE_ID": "CHRONOGRAPH_MONGODB_EXC"})
+                await asyncio.sleep(MONGODB_ERROR_INTERVAL)
+            else:
+                logger.info(f"Created index: {r}", extra={"MESSAGE_ID": "MONGODB_INDEX_SUCCESS"})
+                break
+
+
+async def read_auction(auction_id, projection=None):
+    collection = get_mongodb_collection()
+    while True:
+        try:
+            return await collection.find_one({"_id": auction_id}, projection=projection)
+        except PyMongoError as e:
+            logger.warning(f"Read auction error {type(e)}: {e}",
+                           extra={"MESSAGE_ID": "CHRONOGRAPH_MONGODB_EXC"})
+            await asyncio.sleep(MONGODB_ERROR_INTERVAL)
+
+
+# OUTBOX
+async def add_outbox_job(auction):
+    """
+    Saves a job to publish the auction results.
+    It's keyed by the auction id, so a repeated tick doesn't add another one.
+    Lot jobs wait for the other lots of the tender that finish at about the same time,
+    so they are published together
+    """
+    collection = get_mongodb_collection(OUTBOX_COLLECTION)
+    current_ts = get_now()
+    run_at = current_ts
+    if auction.get("lot_id"):
+        run_at += timedelta(seconds=CHRONOGRAPH_OUTBOX_COALESCE_WINDOW)
+    while True:
+        try:
+            return await collection.update_one(
+                {"_id": auction["_id"]},
+                {
+                    "$setOnInsert": {
+                        "tender_id": auction["tender_id"],
+                        "lot_id": auction.get("lot_id"),
+                        "run_at": run_at,
+                        "created": current_ts,
+                        "attempts": 0,
+                    }
+                },
+                upsert=True,
+            )
+        except PyMongoError as e:
+            logger.warning(f"Add outbox job error {type(e)}: {e}",
+                           extra={"MESSAGE_ID": "CHRONOGRAPH_MONGODB_EXC"})
+            await asyncio.sleep(MONGODB_ERROR_INTERVAL)
+
+
+async def claim_outbox_job(lock):
+    collection = get_mongodb_collection(OUTBOX_COLLECTION)
+    while True:
+        current_ts = get_now()
+        try:
+            return await collection.find_one_and_update(
+                {"run_at": {"$lte": current_ts}},
+                {"$set": {"run_at": current_ts + timedelta(seconds=lock), "lease_owner": new_lease_owner()}},
+                sort=(("run_at", ASCENDING),),
+                return_document=ReturnDocument.AFTER,
+            )
+        except PyMongoError as e:
+            logger.warning(f"Claim outbox job error {type(e)}: {e}",
+                           extra={"MESSAGE_ID": "CHRONOGRAPH_MONGODB_EXC"})
+            await asyncio.sleep(MONGODB_ERROR_INTERVAL)
+
+
+async def claim_tender_outbox_jobs(tender_id, lock):
+    """
+    Leases the due jobs of the tender, they are tagged with a unique lease id by one update_many
+    and read back by it.
+    The jobs that have never been claimed are leased even if they aren't due yet:
+    the lots finished during the coalescing window of the claimed job are published with it.
+    The jobs are published one by one after the already claimed one, so their lease covers all of them
+    """
+    collection = get_mongodb_collection(OUTBOX_COLLECTION)
+    while True:
+        current_ts = get_now()
+        lease_owner = new_lease_owner()
+        try:
+            await collection.update_many(
+                {
+                    "tender_id": tender_id,
+                    "$or": [
+                        {"run_at": {"$lte": current_ts}},
+                        {
+                            "attempts": 0,
+                            "lease_owner": {"$exists": False},
+                            "run_at": {"$lte": current_ts + timedelta(seconds=CHRONOGRAPH_OUTBOX_COALESCE_WINDOW)},
+                        },
+                    ],
+                },
+                {"$set": {"run_at": current_ts + timedelta(seconds=lock), "lease_owner": lease_owner}},
+            )
+            jobs = await collection.find(
+                {"tender_id": tender_id, "lease_owner": lease_owner},
+                sort=(("created", ASCENDING),),
+            ).to_list(length=None)
+            if len(jobs) > 1:
+                await collection.update_many(
+                    {"tender_id": tender_id, "lease_owner": lease_owner},
+                    {"$set": {"run_at": current_ts + timedelta(seconds=lock * (len(jobs) + 1))}},
+                )
+            return jobs
+        except PyMongoError as e:
+            logger.warning(f"Claim outbox jobs error {type(e)}: {e}",
+                           extra={"MESSAGE_ID": "CHRONOGRAPH_MONGODB_EXC"})
+            await asyncio.sleep(MONGODB_ERROR_INTERVAL)
+
+
+async def postpone_outbox_job(job_id, delay, attempts, error):
+    collection = get_mongodb_collection(OUTBOX_COLLECTION)
+    while True:
+        try:
+            return await collection.update_one(
+                {"_id": job_id},
+                {"$set": {
+                    "run_at": get_now() + timedelta(seconds=delay),
+                    "attempts": attempts,
+                    "last_error": error,
+                }},
+            )
+        except PyMongoError as e:
+            logger.warning(f"Postpone outbox job error {type(e)}: {e}",
+                           extra={"MESSAGE_ID": "CHRONOGRAPH_MONGODB_EXC"})
+            await asyncio.sleep(MONGODB_ERROR_INTERVAL)
+
+
+async def delete_outbox_job(job_id):
+    collection = get_mongodb_collection(OUTBOX_COLLECTION)
+    while True:
+        try:
+            return await collection.delete_one({"_id": job_id})
+        except PyMongoError as e:
+            logger.warning(f"Delete outbox job error {type(e)}: {e}",
+                           extra={"MESSAGE_ID": "CHRONOGRAPH_MONGODB_EXC"})
+            await asyncio.sleep(MONGODB_ERROR_INTERVAL)
+
+
+# DEAD LETTERS
+async def add_dead_letter(auction, stage, error):
+    """
+    Saves an auction that chronograph has given up on, so it can be inspected and requeued
+    """
+    collection = get_mongodb_collection(DEAD_LETTERS_COLLECTION)
+    while True:
+        try:
+            return await collection.replace_one(
+                {"_id": auction["_id"]},
+                {
+                    "current_stage": auction.get("current_stage"),
+                    "stage": stage,
+                    "errors_count": auction.get("chronograph_errors_count", 0),
+                    "error": error,
+                    "created": get_now(),
+                },
+                upsert=True,
+            )
+        except PyMongoError as e:
+            logger.warning(f"Add dead letter error {type(e)}: {e}",
+                           extra={"MESSAGE_ID": "CHRONOGRAPH_MONGODB_EXC"})
+            await asyncio.sleep(MONGODB_ERROR_INTERVAL)
+
+
+async def read_dead_letters():
+    collection = get_mongodb_collection(DEAD_LETTERS_COLLECTION)
+    return await collection.find({}, sort=(("created", ASCENDING),)).to_list(length=None)
+
+
+async def requeue_dead_letter(auction_id):
+    """
+    Sets the auction timer, so chronograph tries to process it again,
+    or adds the outbox job again if it's the publication that has failed
+    :return: True if the dead letter has been found
+    """
+    collection = get_mongodb_collection(DEAD_LETTERS_COLLECTION)
+    dead_letter = await collection.find_one({"_id": auction_id})
+    if dead_letter is None:
+        return False
+    if dead_letter["stage"] == PUBLICATION_DEAD_LETTER_STAGE:
+        auction = await read_auction(auction_id, projection=("tender_id", "lot_id"))
+        if auction is not None:
+            await add_outbox_job(auction)
+    else:
+        await get_mongodb_collection().update_one(
+            {"_id": auction_id},
+            {"$set": {"timer": get_now(), "chronograph_errors_count": 0}},
+        )
+    await collection.delete_one({"_id": auction_id})
+    return True
+
+
+# MEMBERS
+async def report_member(worker_id):
+    """
+    Saves that the chronograph replica is alive
+    :return: ids of the replicas that are alive, sorted
+    """
+    collection = get_mongodb_collection(MEMBERS_COLLECTION)
+    current_ts = get_now()
+    await collection.update_one(
+        {"_id": worker_id},
+        {"$set": {"heartbeat": current_ts}},
+        upsert=True,
+    )
+    cursor = collection.find(
+        {"heartbeat": {"$gte": current_ts - timedelta(seconds=CHRONOGRAPH_MEMBERSHIP_TTL)}},
+        projection=("_id",),
+        sort=(("_id", ASCENDING),),
+    )
+    return [m["_id"] async for m in cursor]
+
+
+async def remove_member(worker_id):
+    collection = get_mongodb_collection(MEMBERS_COLLECTION)
+    try:
+        await collection.delete_one({"_id": worker_id})
+    except PyMongoError as e:
+        logger.warning(f"Remove member error {type(e)}: {e}",
+                       extra={"MESSAGE_ID": "CHRONOGRAPH_MONGODB_EXC"})
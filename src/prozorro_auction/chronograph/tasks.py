@@ -4,13 +4,16 @@ from prozorro_auction.chronograph.requests import (
 from prozorro_auction.chronograph.model import (
     build_audit_document, build_results_bids_patch, get_doc_id_from_filename
 )
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 async def upload_audit_document(session, auction, documents):
-    file_name, file_data = build_audit_document(auction)
+    # yaml dump of an auction with many rounds takes a while, so it shouldn't block the event loop
+    loop = asyncio.get_event_loop()
+    file_name, file_data = await loop.run_in_executor(None, build_audit_document, auction)
     doc_id = get_doc_id_from_filename(documents, file_name)
     data = await upload_document(session, file_name, file_data)
     result = await publish_tender_document(session, auction["tender_id"], data, doc_id=doc_id)
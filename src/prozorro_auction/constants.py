@@ -35,6 +35,15 @@ CRITERIA_LCC = [
     CriterionClassificationID.CRITERION_OTHER_LIFE_CYCLE_COST_ECOLOGICAL_COST.value,
 ]
 
+# chronograph claims due timers of the stages with lower priority numbers first,
+# so a bids round isn't delayed by publishing results of another auction
+TIMER_PRIORITIES = {
+    "pause": 0,
+    "bids": 0,
+    "pre_announcement": 1,
+    "announcement": 2,
+}
+
 PROCUREMENT_METHOD_TYPES_DEFAULT = [
     ProcurementMethodType.CLOSE_FRAMEWORK_AGREEMENT_UA.value,
     ProcurementMethodType.CLOSE_FRAMEWORK_AGREEMENT_SELECTION_UA.value,
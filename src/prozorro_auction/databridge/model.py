@@ -1,14 +1,17 @@
 from copy import deepcopy
 from datetime import timedelta
+from hashlib import md5
 
 from prozorro_auction.utils.base import get_now, convert_datetime, copy_fields
 from prozorro_auction.databridge.importers import AuctionBidImporterFactory
-from prozorro_auction.constants import AuctionType, CRITERIA_LCC
+from prozorro_auction.utils.ranking import calculate_bid_sort_key
+from prozorro_auction.constants import AuctionType, CRITERIA_LCC, TIMER_PRIORITIES
 from prozorro_auction.settings import (
     logger,
     TEST_MODE,
     AUCTION_HOST,
     QUICK_MODE_FAST_AUCTION_START_AFTER,
+    CHRONOGRAPH_BUCKETS,
 )
 
 
@@ -99,6 +102,13 @@ def get_bids_data(auction, active_bids, lot=None):
                     bids_data.append(importer.import_auction_bid_data(lot_value))
         else:
             bids_data.append(importer.import_auction_bid_data())
+    # bids are ranked by these keys, so the amounts are not parsed on every sort
+    for bid_data in bids_data:
+        try:
+            bid_data["sort_key"] = calculate_bid_sort_key(bid_data, auction["auction_type"])
+        except (KeyError, NotImplementedError):
+            # esco bids may come without amounts, the chronograph calculates their keys when ranks them
+            pass
     return bids_data
 
 
@@ -341,9 +351,25 @@ def get_auctions_from_tender(tender):
             auction["stages"] = build_stages(auction)
             auction["current_stage"] = -1
             auction["timer"] = auction["start_at"]   # for chronograph update
+            auction["timer_priority"] = TIMER_PRIORITIES.get(auction["stages"][0]["type"], 0)
+            auction["bucket"] = get_auction_bucket(auction["_id"])
+            # the results of a re-planned auction are published again
+            auction["_audit_document_posted"] = False
+            auction["_auction_results_sent"] = False
             yield auction
 
 
+def get_auction_bucket(auction_id):
+    """
+    A stable number in range(CHRONOGRAPH_BUCKETS) derived from the auction id,
+    chronograph replicas share the buckets out to claim different auctions
+
+    :param auction_id: auction id
+    :return: bucket number
+    """
+    return int(md5(auction_id.encode()).hexdigest()[:8], 16) % CHRONOGRAPH_BUCKETS
+
+
 def build_stages(auction):
     """
     Build stages for auction
@@ -7,6 +7,13 @@ import asyncio
 # List of indexes to be created in auctions collection
 DB_INDEXES = [
     {'keys': [('timer', ASCENDING)], 'sparse': True},
+    {'keys': [('timer_priority', ASCENDING), ('timer', ASCENDING)], 'sparse': True},  # chronograph claims
+    # partitioned chronograph claims: every bucket is scanned in the claim order and the scans are merged,
+    # auctions without a bucket are indexed too (the claims include them)
+    {
+        'keys': [('bucket', ASCENDING), ('timer_priority', ASCENDING), ('timer', ASCENDING)],
+        'partialFilterExpression': {'timer': {'$exists': True}},
+    },
     {'keys': [('start_at', DESCENDING)]}
 ]
 
@@ -52,6 +52,8 @@ READ_CONCERN = ReadConcern(level=os.environ.get("READ_CONCERN") or "majority")
 
 # number of seconds to protect auction from other workers
 PROCESSING_LOCK = float(os.getenv("PROCESSING_LOCK", 1))
+# auctions are split by their ids into this number of buckets shared out among chronograph replicas
+CHRONOGRAPH_BUCKETS = int(os.getenv("CHRONOGRAPH_BUCKETS", 64))
 AUCTION_HOST = os.getenv("AUCTION_HOST", "http://localhost:8080")
 assert not AUCTION_HOST.endswith("/")
 assert AUCTION_HOST.startswith("http")
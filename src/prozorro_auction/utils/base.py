@@ -1,4 +1,5 @@
 from decimal import Decimal
+import random
 
 import pytz
 from datetime import datetime
@@ -33,3 +34,16 @@ def copy_fields(dest, source, fields):
 
 def as_decimal(value):
     return Decimal(str(value))
+
+
+def get_backoff_delay(attempt, base, max_delay):
+    """
+    Exponential backoff with jitter: half of the delay is fixed and the other half is random,
+    so retries of many failed tasks spread over time
+    :param attempt: number of the retry starting with 1
+    :param base: delay of the first retry, seconds
+    :param max_delay: delay limit, seconds
+    :return: delay, seconds
+    """
+    delay = min(max_delay, base * 2 ** min(attempt - 1, 32))
+    return delay / 2 + random.uniform(0, delay / 2)
@@ -0,0 +1,33 @@
+from bson.decimal128 import create_decimal128_context
+from decimal import Decimal
+from fractions import Fraction
+from prozorro_auction.constants import AuctionType
+
+# sort keys are saved as Decimal128, so they are rounded to its 34 significant digits
+SORT_KEY_CONTEXT = create_decimal128_context()
+
+
+def to_sort_key(amount):
+    if isinstance(amount, Fraction):
+        return SORT_KEY_CONTEXT.divide(Decimal(amount.numerator), Decimal(amount.denominator))
+    return SORT_KEY_CONTEXT.create_decimal(str(amount))
+
+
+def calculate_bid_sort_key(bid, auction_type):
+    """
+    The amount the bids of an auction are ranked by, as a normalized decimal
+    :param bid: auction bid
+    :param auction_type: AuctionType value of the auction
+    :return: Decimal
+    """
+    is_esco = "amountPerformance" in bid["value"]
+    if auction_type == AuctionType.MEAT.value:
+        return to_sort_key(Fraction(bid["amount_features"]))
+    if auction_type == AuctionType.LCC.value:
+        if is_esco:
+            raise NotImplementedError()
+        return to_sort_key(bid["amount_weighted"])
+    # mixed auction bids have always been ranked by their amounts, not amount_weighted
+    if is_esco:
+        return to_sort_key(Fraction(bid["value"]["amountPerformance"]))
+    return to_sort_key(bid["value"]["amount"])
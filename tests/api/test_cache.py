@@ -0,0 +1,108 @@
+import pytest
+from unittest.mock import patch
+
+from prozorro_auction.api.cache import AuctionCache, PayloadCache
+from tests.base import FakeClock
+
+
+@pytest.mark.asyncio
+async def test_auction_cache():
+    clock = FakeClock()
+    reads = []
+
+    async def get_auction(auction_id, fields):
+        reads.append(auction_id)
+        return {"_id": auction_id, "current_stage": len(reads)}
+
+    cache = AuctionCache("test", ("current_stage",), size=2, ttl=10, time=clock)
+    with patch("prozorro_auction.api.cache.get_auction", get_auction):
+        assert await cache.get("a") == {"_id": "a", "current_stage": 1}
+        assert await cache.get("a") == {"_id": "a", "current_stage": 1}
+        assert reads == ["a"]
+
+        clock.now += 10  # expired
+        assert await cache.get("a") == {"_id": "a", "current_stage": 2}
+
+        await cache.get("b")
+        await cache.get("a")
+        await cache.get("c")  # "b" is the least recently used
+        assert reads == ["a", "a", "b", "c"]
+        await cache.get("a")
+        await cache.get("b")
+        assert reads == ["a", "a", "b", "c", "b"]
+
+        cache.invalidate("b")
+        await cache.get("b")
+        assert reads == ["a", "a", "b", "c", "b", "b"]
+
+
+@pytest.mark.asyncio
+async def test_changes_update_cached_auctions():
+    async def get_auction(auction_id, fields):
+        return {"_id": auction_id, "current_stage": 1, "modified": 1, "bids": [{"id": "b1"}]}
+
+    get_cache = AuctionCache("get", ("_id", "current_stage", "modified"))
+    post_bid_cache = AuctionCache("post_bid", ("current_stage", "modified", "bids.id"))
+    with patch("prozorro_auction.api.cache.get_auction", get_auction):
+        await get_cache.get("a")
+        await post_bid_cache.get("a")
+
+        get_cache.on_change({"_id": "b", "current_stage": 1, "modified": 1, "items": []})
+        post_bid_cache.on_change({"_id": "b", "current_stage": 1, "modified": 1, "items": []})
+        assert "b" not in get_cache._entries
+        assert "b" not in post_bid_cache._entries
+
+        # a bid is posted
+        get_cache.on_change({"_id": "a", "current_stage": 1, "modified": 1, "items": []})
+        post_bid_cache.on_change({"_id": "a", "current_stage": 1, "modified": 1, "items": []})
+        assert await get_cache.get("a") == {"_id": "a", "current_stage": 1, "modified": 1}
+        assert "a" in post_bid_cache._entries
+
+        # the next stage
+        get_cache.on_change({"_id": "a", "current_stage": 2, "modified": 2, "items": []})
+        post_bid_cache.on_change({"_id": "a", "current_stage": 2, "modified": 2, "items": []})
+        assert await get_cache.get("a") == {"_id": "a", "current_stage": 2, "modified": 2}
+        assert "a" not in post_bid_cache._entries
+
+
+def test_payload_cache():
+    cache = PayloadCache(size=1)
+    auction = {"_id": "a", "modified": 1, "is_masked": False, "title": "Auction"}
+
+    body = cache.get_body(auction)
+    assert body == b'{"_id": "a", "modified": 1, "title": "Auction"}'
+    assert cache.get_text(dict(auction)) is cache.get_text(auction)
+    assert "is_masked" in auction
+
+    text = cache.get_text(dict(auction, modified=2, title="Changed"))
+    assert text == '{"_id": "a", "modified": 2, "title": "Changed"}'
+
+    # the chronograph leases don't update "modified"
+    text = cache.get_text(dict(auction, modified=2, title="Changed", timer=3))
+    assert text == '{"_id": "a", "modified": 2, "title": "Changed", "timer": 3}'
+
+    cache.get_body({"_id": "b", "modified": 1})
+    assert list(cache._entries) == ["b"]
+
+
+@pytest.mark.asyncio
+async def test_refresh_keeps_changes_made_during_read():
+    clock = FakeClock()
+    reads = []
+
+    async def get_auction(auction_id, fields):
+        reads.append(auction_id)
+        auction = {"_id": auction_id, "current_stage": len(reads), "modified": len(reads)}
+        if len(reads) > 1:
+            # the change stream delivers a newer version while the read is awaited
+            cache.on_change({"_id": auction_id, "current_stage": 5, "modified": 5, "items": []})
+        return auction
+
+    cache = AuctionCache("test", ("current_stage", "modified"), ttl=10, time=clock)
+    with patch("prozorro_auction.api.cache.get_auction", get_auction):
+        await cache.get("a")
+        clock.now += 10
+        assert await cache.get("a") == {"current_stage": 5, "modified": 5}
+        assert await cache.get("a") == {"current_stage": 5, "modified": 5}
+        assert reads == ["a", "a"]
+        assert cache._reads == {}
@@ -0,0 +1,31 @@
+from copy import deepcopy
+from unittest import TestCase
+from unittest.mock import patch
+
+from prozorro_auction.api.mask import mask_data
+
+
+class MaskDataTestCase(TestCase):
+
+    @patch("prozorro_auction.api.mask.MASK_OBJECT_DATA_SINGLE", True)
+    def test_mask_data_copy(self):
+        auction = {
+            "_id": "a",
+            "is_masked": True,
+            "title": "Auction",
+            "value": {"amount": 100, "currency": "UAH"},
+            "procuringEntity": {"name": "Entity", "identifier": {"id": "12345678", "scheme": "UA-EDR"}},
+        }
+        original = deepcopy(auction)
+
+        masked = mask_data(auction)
+        self.assertEqual(auction, original)
+        self.assertNotIn("is_masked", masked)
+        self.assertEqual(masked["value"], {"amount": 0, "currency": "UAH"})
+        self.assertEqual(masked["procuringEntity"]["name"], "000000")
+        self.assertEqual(masked["procuringEntity"]["identifier"], {"id": "00000000", "scheme": "000000"})
+
+    def test_not_masked(self):
+        auction = {"_id": "a", "is_masked": False, "title": "Auction"}
+        self.assertEqual(mask_data(auction), {"_id": "a", "title": "Auction"})
+        self.assertIn("is_masked", auction)
@@ -0,0 +1,99 @@
+from unittest.mock import patch
+import pytest
+
+from prozorro_auction.api.storage import get_changes_pipeline, ChangesWatcher, GET_FIELDS
+from tests.base import FakeClock
+
+
+def test_changes_pipeline():
+    pipeline = get_changes_pipeline({"a"})
+    assert pipeline[0]["$match"]["documentKey._id"] == {"$in": ["a"]}
+    assert pipeline[1]["$project"]["documentKey"] == 1
+    assert all(pipeline[1]["$project"][f"fullDocument.{f}"] == 1 for f in GET_FIELDS)
+    assert "fullDocument.bids" not in pipeline[1]["$project"]
+
+
+class FakeChangeStream:
+
+    def __init__(self, changes, pipeline, resume_after):
+        self.changes = changes
+        self.pipeline = pipeline
+        self.resume_after = resume_after
+        self.resume_token = resume_after
+        self.alive = True
+
+    async def try_next(self):
+        if self.changes:
+            change = self.changes.pop(0)
+            self.resume_token = change["_id"]
+            return change
+
+    async def close(self):
+        self.alive = False
+
+
+class FakeCollection:
+
+    def __init__(self, changes):
+        self.changes = changes
+        self.streams = []
+
+    def watch(self, pipeline, full_document=None, resume_after=None, max_await_time_ms=None):
+        stream = FakeChangeStream(self.changes, pipeline, resume_after)
+        self.streams.append(stream)
+        return stream
+
+
+@pytest.mark.asyncio
+async def test_stream_is_reopened_for_new_ids():
+    watched = {"a"}
+    collection = FakeCollection([
+        {"_id": "token1", "fullDocument": {"_id": "a", "modified": 1}},
+        {"_id": "token2", "fullDocument": None},
+        {"_id": "token3", "fullDocument": {"_id": "b", "modified": 1}},
+    ])
+    received = []
+
+    with patch("prozorro_auction.api.storage.get_mongodb_collection", lambda: collection):
+        async for auction in ChangesWatcher(reopen_interval=0).watch(lambda: watched):
+            received.append(auction)
+            if len(received) == 1:
+                watched = {"a", "b"}
+            else:
+                break
+
+    assert received == [{"_id": "a", "modified": 1}, {"_id": "b", "modified": 1}]
+    assert len(collection.streams) == 2
+    assert collection.streams[0].resume_after is None
+    assert collection.streams[1].resume_after == "token1"
+    assert collection.streams[1].pipeline[0]["$match"]["documentKey._id"]["$in"] in (["a", "b"], ["b", "a"])
+
+
+@pytest.mark.asyncio
+async def test_changes_between_read_and_reopen():
+    clock = FakeClock()
+    watcher = ChangesWatcher(reopen_interval=10, time=clock)
+    watched = {"a"}
+    collection = FakeCollection([
+        {"_id": "token1", "fullDocument": {"_id": "a", "modified": 1}},
+        {"_id": "token2", "fullDocument": {"_id": "a", "modified": 2}},
+        {"_id": "token3", "fullDocument": {"_id": "a", "modified": 3}},
+        {"_id": "token4", "fullDocument": {"_id": "b", "modified": 1}},
+    ])
+
+    with patch("prozorro_auction.api.storage.get_mongodb_collection", lambda: collection):
+        async for auction in watcher.watch(lambda: watched):
+            if auction == {"_id": "a", "modified": 1}:
+                with watcher.reading():
+                    watched = watched | {"b"}  # "b" is read and cached
+            elif auction == {"_id": "a", "modified": 2}:
+                assert len(collection.streams) == 1  # new ids wait for the reopen interval
+            elif auction == {"_id": "a", "modified": 3}:
+                clock.now += 10
+            else:
+                assert auction == {"_id": "b", "modified": 1}
+                break
+
+    assert len(collection.streams) == 2
+    # the changes of "b" after its read are delivered by the new stream
+    assert collection.streams[1].resume_after == "token1"
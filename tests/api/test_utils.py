@@ -0,0 +1,41 @@
+from datetime import datetime
+from unittest import TestCase
+from unittest.mock import Mock
+
+from prozorro_auction.api.utils import get_etag, get_last_modified, is_not_modified
+
+
+class ETagTestCase(TestCase):
+
+    def test_etag_follows_modified(self):
+        auction = {"_id": "a", "modified": datetime(2021, 3, 1, 10, 0, 0, 123)}
+        etag = get_etag([auction])
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+        self.assertEqual(etag, get_etag([{"_id": "a", "modified": datetime(2021, 3, 1, 10, 0, 0, 123)}]))
+        self.assertNotEqual(etag, get_etag([{"_id": "a", "modified": datetime(2021, 3, 1, 10, 0, 0, 124)}]))
+        self.assertNotEqual(etag, get_etag([auction, {"_id": "b", "modified": None}]))
+
+    def test_etag_follows_timer(self):
+        # the chronograph leases don't update "modified"
+        auction = {"_id": "a", "modified": datetime(2021, 3, 1), "timer": datetime(2021, 3, 1, 10)}
+        self.assertNotEqual(get_etag([auction]), get_etag([dict(auction, timer=datetime(2021, 3, 1, 10, 1))]))
+        self.assertNotEqual(get_etag([auction]), get_etag([dict(auction, timer=None)]))
+
+    def test_last_modified(self):
+        self.assertEqual(
+            get_last_modified([
+                {"_id": "a", "modified": datetime(2021, 3, 1)},
+                {"_id": "b", "modified": datetime(2021, 3, 2)},
+                {"_id": "c"},
+            ]),
+            datetime(2021, 3, 2),
+        )
+        self.assertIsNone(get_last_modified([{"_id": "c"}]))
+
+    def test_is_not_modified(self):
+        etag = '"abc"'
+        self.assertTrue(is_not_modified(Mock(headers={"If-None-Match": '"abc"'}), etag))
+        self.assertTrue(is_not_modified(Mock(headers={"If-None-Match": '"xyz", W/"abc"'}), etag))
+        self.assertTrue(is_not_modified(Mock(headers={"If-None-Match": "*"}), etag))
+        self.assertFalse(is_not_modified(Mock(headers={"If-None-Match": '"xyz"'}), etag))
+        self.assertFalse(is_not_modified(Mock(headers={}), etag))
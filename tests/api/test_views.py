@@ -0,0 +1,67 @@
+from unittest.mock import patch
+import pytest
+
+from prozorro_auction.api.utils import ValidationError
+from prozorro_auction.api.views import save_posted_bid
+
+
+class FakeCache:
+
+    def __init__(self, cached, fresh):
+        self.cached = cached
+        self.fresh = fresh
+        self.refreshed = 0
+
+    async def get(self, auction_id):
+        return self.cached
+
+    async def refresh(self, auction_id):
+        self.refreshed += 1
+        return self.fresh
+
+
+def get_auction(current_stage):
+    return {
+        "_id": "a",
+        "procurementMethodType": "aboveThresholdUA",
+        "current_stage": current_stage,
+        "minimalStep": {"amount": 10},
+        "stages": [
+            {"type": "pause"},
+            {"type": "bids", "bidder_id": "b1", "amount": 100},
+        ],
+        "bids": [{"id": "b1", "hash": "h1"}],
+    }
+
+
+@pytest.fixture
+def saved_bids():
+    calls = []
+
+    async def update_auction_bid_stage(auction_id, bidder_id, current_stage, posted_bid):
+        calls.append((auction_id, bidder_id, current_stage, posted_bid["amount"]))
+        return {"bids": [{"id": bidder_id}]}
+
+    with patch("prozorro_auction.api.views.update_auction_bid_stage", update_auction_bid_stage):
+        yield calls
+
+
+@pytest.mark.asyncio
+async def test_stale_stage_is_read_again(saved_bids):
+    cache = FakeCache(get_auction(0), get_auction(1))
+    with patch("prozorro_auction.api.views.POST_BID_CACHE", cache):
+        auction, posted_bid, bid = await save_posted_bid("a", "b1", "h1", {"amount": 90})
+    assert auction["current_stage"] == 1
+    assert cache.refreshed == 1
+    assert saved_bids == [("a", "b1", 1, 90)]
+
+
+@pytest.mark.asyncio
+async def test_invalid_amount_is_not_read_again(saved_bids):
+    cache = FakeCache(get_auction(1), get_auction(1))
+    with patch("prozorro_auction.api.views.POST_BID_CACHE", cache):
+        with pytest.raises(ValidationError) as e:
+            await save_posted_bid("a", "b1", "h1", {"amount": 100})
+    assert e.value.text == '{"error": "Too high value"}'
+    assert cache.refreshed == 0
+    assert saved_bids == []
@@ -637,3 +637,12 @@ class AsyncMock(MagicMock):
 
     async def __aenter__(self):
         return self
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
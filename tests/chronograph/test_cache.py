@@ -0,0 +1,90 @@
+from unittest.mock import patch
+import asyncio
+import pytest
+
+from prozorro_auction.base_requests import NOT_MODIFIED
+from prozorro_auction.chronograph.cache import TenderCache
+from tests.base import FakeClock
+
+
+@pytest.mark.asyncio
+async def test_lots_share_tender_responses():
+    calls = []
+
+    async def request_tender(session, tender_id, url_suffix="", etag=None):
+        calls.append((tender_id, url_suffix, etag))
+        await asyncio.sleep(0.01)
+        return {"bids": [{"id": "b1"}]}, '"v1"'
+
+    cache = TenderCache(ttl=30, max_age=300)
+    with patch("prozorro_auction.chronograph.cache.request_tender", request_tender):
+        results = await asyncio.gather(*(cache.get(None, "t1", "/auction") for _ in range(20)))
+        await cache.get(None, "t1", "/auction")
+        await cache.get(None, "t2", "/auction")
+
+    assert all(r == {"bids": [{"id": "b1"}]} for r in results)
+    assert calls == [("t1", "/auction", ""), ("t2", "/auction", "")]
+
+
+@pytest.mark.asyncio
+async def test_revalidation():
+    clock = FakeClock()
+    responses = [({"documents": []}, '"v1"'), (NOT_MODIFIED, '"v1"'), ({"documents": [{"id": "d1"}]}, '"v2"')]
+    calls = []
+
+    async def request_tender(session, tender_id, url_suffix="", etag=None):
+        calls.append(etag)
+        return responses.pop(0)
+
+    cache = TenderCache(ttl=30, max_age=300, time=clock)
+    with patch("prozorro_auction.chronograph.cache.request_tender", request_tender):
+        assert await cache.get(None, "t1") == {"documents": []}
+        clock.now += 30
+        assert await cache.get(None, "t1") == {"documents": []}
+        cache.update("t1", lambda tender: {"documents": [{"id": "d0"}]})
+        assert await cache.get(None, "t1") == {"documents": [{"id": "d0"}]}
+        cache.invalidate("t1")
+        assert await cache.get(None, "t1") == {"documents": [{"id": "d1"}]}
+
+    assert calls == ["", '"v1"', ""]
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_not_cached():
+    calls = []
+
+    async def request_tender(session, tender_id, url_suffix="", etag=None):
+        calls.append(etag)
+        await asyncio.sleep(0.01)
+        raise ValueError("api error")
+
+    cache = TenderCache(ttl=30, max_age=300)
+    with patch("prozorro_auction.chronograph.cache.request_tender", request_tender):
+        results = await asyncio.gather(cache.get(None, "t1"), cache.get(None, "t1"), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        with pytest.raises(ValueError):
+            await cache.get(None, "t1")
+
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_is_made_again():
+    calls = []
+
+    async def request_tender(session, tender_id, url_suffix="", etag=None):
+        calls.append(etag)
+        await asyncio.sleep(0.01)
+        return {"bids": []}, '"v1"'
+
+    cache = TenderCache(ttl=30, max_age=300)
+    with patch("prozorro_auction.chronograph.cache.request_tender", request_tender):
+        first = asyncio.ensure_future(cache.get(None, "t1", "/auction"))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.get(None, "t1", "/auction"))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await asyncio.wait_for(second, 1) == {"bids": []}
+        assert first.cancelled()
+
+    assert len(calls) == 2
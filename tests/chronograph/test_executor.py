@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+
+from prozorro_auction.chronograph.executor import TickExecutor
+
+
+@pytest.mark.asyncio
+async def test_ticks_of_one_auction_are_serialized():
+    running = set()
+    log = []
+
+    async def handler(auction, n):
+        assert auction["_id"] not in running
+        running.add(auction["_id"])
+        log.append(("start", auction["_id"], n))
+        await asyncio.sleep(0.01)
+        log.append(("end", auction["_id"], n))
+        running.remove(auction["_id"])
+
+    executor = TickExecutor(handler, concurrency=2, queue_size=1)
+    assert executor.free_slots == 3
+    executor.submit({"_id": "a"}, 1)
+    executor.submit({"_id": "a"}, 2)
+    executor.submit({"_id": "b"}, 3)
+    assert executor.free_slots == 0
+
+    await executor.drain()
+    assert executor.free_slots == 3
+    assert log.index(("end", "a", 1)) < log.index(("start", "a", 2))
+    # "b" doesn't wait for "a"
+    assert log.index(("start", "b", 3)) < log.index(("end", "a", 1))
+
+
+@pytest.mark.asyncio
+async def test_wait_for_free_slot():
+    async def handler(auction):
+        await asyncio.sleep(0.01)
+
+    executor = TickExecutor(handler, concurrency=1)
+    executor.submit({"_id": "a"})
+    assert executor.free_slots == 0
+
+    await executor.wait_for_free_slot()
+    assert executor.free_slots == 1
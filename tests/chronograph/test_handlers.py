@@ -0,0 +1,40 @@
+import pytest
+
+from prozorro_auction.chronograph.handlers import (
+    STAGE_HANDLERS, STAGE_START, STAGE_END, on_stage_start, get_stage_handler, run_stage_handler,
+)
+from prozorro_auction.chronograph import stages
+
+
+def test_builtin_handlers_registered():
+    assert get_stage_handler(STAGE_START, "pause") is stages.on_start_stage_pause
+    assert get_stage_handler(STAGE_END, "bids") is stages.on_end_stage_bids
+    assert get_stage_handler(STAGE_START, "announcement") is stages.on_start_stage_announcement
+    assert get_stage_handler(STAGE_END, "pause") is None
+
+
+@pytest.mark.asyncio
+async def test_plugged_handler():
+    calls = []
+
+    @on_stage_start("test_stage")
+    async def handler(auction):
+        calls.append(auction["_id"])
+
+    try:
+        with pytest.raises(ValueError):
+            on_stage_start("test_stage")(handler)
+
+        await run_stage_handler(STAGE_START, "test_stage", {"_id": "a"})
+        await run_stage_handler(STAGE_END, "test_stage", {"_id": "b"})
+        assert calls == ["a"]
+    finally:
+        del STAGE_HANDLERS[STAGE_START]["test_stage"]
+
+
+@pytest.mark.asyncio
+async def test_announcement_adds_outbox_job_after_save():
+    # the job is added by process_auction when the tick is saved
+    auction = {"_id": "a", "tender_id": "t"}
+    await run_stage_handler(STAGE_START, "announcement", auction)
+    assert auction["add_outbox_job"] is True
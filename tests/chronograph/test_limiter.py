@@ -0,0 +1,84 @@
+import pytest
+
+from prozorro_auction.chronograph.limiter import RateLimiter, get_retry_after
+from tests.base import FakeClock
+
+
+def get_limiter(clock, **kwargs):
+    kwargs.setdefault("rate", 10)
+    kwargs.setdefault("min_rate", 1)
+    kwargs.setdefault("max_rate", 100)
+    kwargs.setdefault("increase", 1)
+    kwargs.setdefault("decrease", 0.5)
+    return RateLimiter("api", time=clock, **kwargs)
+
+
+def test_rate_decreases_on_throttling():
+    clock = FakeClock()
+    limiter = get_limiter(clock)
+
+    limiter.on_response(429)
+    assert limiter.rate == 5
+    # responses to the requests sent before the decrease don't decrease the rate again
+    limiter.on_response(503)
+    assert limiter.rate == 5
+
+    clock.now += 1
+    limiter.on_response(502)
+    assert limiter.rate == 2.5
+
+    clock.now += 1
+    limiter.on_response(500)
+    clock.now += 1
+    limiter.on_response(500)
+    assert limiter.rate == 1  # min rate
+
+
+def test_rate_increases_on_success():
+    clock = FakeClock()
+    limiter = get_limiter(clock)
+
+    for _ in range(10):
+        limiter.on_response(200)
+    assert 10.9 < limiter.rate < 11
+
+    limiter.on_response(404)
+    limiter.on_response(412)
+    assert 10.9 < limiter.rate < 11
+
+    limiter = get_limiter(clock, rate=100)
+    limiter.on_response(201)
+    assert limiter.rate == 100  # max rate
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_tokens():
+    clock = FakeClock()
+    limiter = get_limiter(clock, rate=1000, max_rate=1000)
+
+    await limiter.acquire()
+    # the bucket is refilled at the rate
+    clock.now += 0.01
+    for _ in range(10):
+        await limiter.acquire()
+    assert limiter._tokens < 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_blocks_requests():
+    clock = FakeClock()
+    limiter = get_limiter(clock, rate=1000, max_rate=1000)
+    clock.now += 1
+
+    limiter.on_response(429, retry_after=2)
+    assert limiter._get_delay() == 2
+    clock.now += 2
+    assert limiter._get_delay() == 0
+    await limiter.acquire()
+
+
+def test_get_retry_after():
+    assert get_retry_after({"Retry-After": "5"}) == 5
+    assert get_retry_after({"Retry-After": "3600"}) == 60
+    assert get_retry_after({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) is None
+    assert get_retry_after({}) is None
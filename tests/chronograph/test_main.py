@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import pytest
+
+from prozorro_auction.chronograph.main import postpone_timer_on_error
+
+
+@pytest.fixture
+def saved():
+    calls = []
+
+    async def update_auction(data, update_date=True, original=None, lease_owner=None):
+        calls.append((data, lease_owner))
+
+    async def add_dead_letter(auction, stage, error):
+        calls.append(("dead_letter", auction["_id"], stage, error))
+
+    with patch("prozorro_auction.chronograph.main.update_auction", update_auction), \
+            patch("prozorro_auction.chronograph.main.add_dead_letter", add_dead_letter), \
+            patch("prozorro_auction.chronograph.main.CHRONOGRAPH_RETRY_BASE", 1), \
+            patch("prozorro_auction.chronograph.main.CHRONOGRAPH_MAX_ERRORS", 3):
+        yield calls
+
+
+@pytest.mark.asyncio
+async def test_postponed_timer_starts_now(saved):
+    # the timer of the claimed auction is its lease expiry
+    lease_until = datetime.utcnow() + timedelta(minutes=5)
+    auction = {"_id": "a", "timer": lease_until, "lease_owner": "w1:1", "stages": [], "chronograph_errors_count": 1}
+    before = datetime.utcnow()
+    await postpone_timer_on_error(auction, ValueError("error"))
+    after = datetime.utcnow()
+
+    (data, lease_owner), = saved
+    assert lease_owner == "w1:1"
+    assert data["chronograph_errors_count"] == 2
+    assert data["timer"].tzinfo is None
+    assert before + timedelta(seconds=1) <= data["timer"] <= after + timedelta(seconds=2)
+
+
+@pytest.mark.asyncio
+async def test_last_error_goes_to_dead_letters(saved):
+    auction = {"_id": "a", "timer": datetime.utcnow(), "current_stage": -1, "stages": [],
+               "chronograph_errors_count": 2}
+    await postpone_timer_on_error(auction, ValueError("error"))
+
+    assert saved[0] == ("dead_letter", "a", "Stage: -1", "ValueError('error')")
+    assert saved[1] == ({"_id": "a", "chronograph_errors_count": 3, "timer": None}, None)
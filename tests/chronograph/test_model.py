@@ -1,8 +1,16 @@
 import unittest
 
 from copy import deepcopy
+from decimal import Decimal
 
-from prozorro_auction.chronograph.model import build_audit_document
+from prozorro_auction.chronograph.model import (
+    build_audit_document,
+    get_bidder_numbers,
+    get_sorted_bids,
+    sort_bids,
+    publish_bids_made_in_current_stage,
+    SORTED_BIDS_KEY,
+)
 
 from tests.chronograph.base import (
     test_auction,
@@ -57,3 +65,51 @@ class AuditTestCase(unittest.TestCase):
         name, content = build_audit_document(auction)
         self.assertEqual(name, "audit_123.yaml")
         self.assertEqual(content.decode(), test_audit_with_stages_lcc)
+
+
+class BidsRankingTestCase(unittest.TestCase):
+
+    def test_bidder_numbers(self):
+        self.assertEqual(
+            get_bidder_numbers(test_auction["initial_bids"]),
+            {
+                "c1aacdd8b6574e668824fca035b5f65f": 0,
+                "d9018f974341493e9d6b379295438499": 1,
+            }
+        )
+
+    def test_sorted_bids_are_reused_until_published(self):
+        auction = deepcopy(test_auction)
+        auction["current_stage"] = 1
+        auction["stages"].extend(deepcopy(test_auction_with_stages))
+        sorted_bids = get_sorted_bids(auction)
+        self.assertEqual([b["id"] for b in sorted_bids], ["b", "a"])
+        self.assertIs(get_sorted_bids(auction), sorted_bids)
+
+        auction["bids"][0]["stages"] = {"1": {"amount": 400, "time": "2019-08-12T14:54:00+03:00"}}
+        publish_bids_made_in_current_stage(auction)
+        self.assertNotIn(SORTED_BIDS_KEY, auction)
+        self.assertEqual([b["id"] for b in get_sorted_bids(auction)], ["a", "b"])
+
+    def test_sort_keys(self):
+        bids = [
+            {"id": "a", "date": "2019-08-12T14:53:52+03:00", "value": {"amount": 200}},
+            {"id": "b", "date": "2019-08-12T14:53:53+03:00", "value": {"amount": 300}},
+            {"id": "c", "date": "2019-08-12T14:53:51+03:00", "value": {"amount": 300}},
+        ]
+        self.assertEqual([b["id"] for b in sort_bids(bids)], ["b", "c", "a"])
+        self.assertEqual([b["id"] for b in sort_bids(bids, "default")], ["b", "c", "a"])
+
+        # a saved sort key is used instead of the amount
+        bids[0]["sort_key"] = Decimal("400")
+        self.assertEqual([b["id"] for b in sort_bids(bids, "default")], ["a", "b", "c"])
+
+    def test_sort_mixed_bids_by_amount(self):
+        bids = [
+            {"id": "a", "date": "2019-08-12T14:53:52+03:00", "value": {"amount": 200},
+             "amount_weighted": 300, "denominator": 0.5, "addition": 100},
+            {"id": "b", "date": "2019-08-12T14:53:52+03:00", "value": {"amount": 250},
+             "amount_weighted": 250, "denominator": 1, "addition": 0},
+        ]
+        self.assertEqual([b["id"] for b in sort_bids(bids)], ["b", "a"])
+        self.assertEqual([b["id"] for b in sort_bids(bids, "mixed")], ["b", "a"])
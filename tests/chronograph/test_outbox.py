@@ -0,0 +1,87 @@
+from unittest.mock import patch
+import pytest
+
+from prozorro_auction.chronograph.outbox import publish_auction_results, process_outbox_job
+
+
+@pytest.fixture
+def publish_calls():
+    calls = []
+
+    async def get_tender_data(session, tender_id):
+        return []
+
+    async def upload_audit_document(session, auction, tender_documents):
+        calls.append("audit")
+
+    async def send_auction_results(session, auction, tender_bids):
+        calls.append("results")
+
+    async def update_auction(data, update_date=True):
+        calls.append(sorted(k for k in data if k != "_id"))
+
+    with patch("prozorro_auction.chronograph.outbox.get_tender_documents", get_tender_data), \
+            patch("prozorro_auction.chronograph.outbox.get_tender_bids", get_tender_data), \
+            patch("prozorro_auction.chronograph.outbox.upload_audit_document", upload_audit_document), \
+            patch("prozorro_auction.chronograph.outbox.send_auction_results", send_auction_results), \
+            patch("prozorro_auction.chronograph.outbox.update_auction", update_auction):
+        yield calls
+
+
+@pytest.mark.asyncio
+async def test_retry_skips_done_steps(publish_calls):
+    auction = {"_id": "a", "tender_id": "t", "_audit_document_posted": True}
+    await publish_auction_results(None, auction)
+    assert publish_calls == ["results", ["_auction_results_sent"]]
+
+
+@pytest.mark.asyncio
+async def test_rerun_publishes_again(publish_calls):
+    # the databridge resets the flags when the auction is planned again
+    auction = {"_id": "a", "tender_id": "t", "_audit_document_posted": False, "_auction_results_sent": False}
+    await publish_auction_results(None, auction)
+    assert publish_calls == ["audit", ["_audit_document_posted"], "results", ["_auction_results_sent"]]
+
+
+@pytest.fixture
+def failing_job_calls():
+    calls = []
+
+    async def read_auction(auction_id, projection=None):
+        return {"_id": auction_id, "tender_id": "t"}
+
+    async def publish_auction_results(session, auction):
+        raise ValueError("api error")
+
+    async def postpone_outbox_job(job_id, delay, attempts, error):
+        calls.append(("postpone", job_id, attempts))
+
+    async def add_dead_letter(auction, stage, error):
+        calls.append(("dead_letter", auction["_id"], stage, auction["chronograph_errors_count"], error))
+
+    async def delete_outbox_job(job_id):
+        calls.append(("delete", job_id))
+
+    with patch("prozorro_auction.chronograph.outbox.read_auction", read_auction), \
+            patch("prozorro_auction.chronograph.outbox.get_session", lambda: None), \
+            patch("prozorro_auction.chronograph.outbox.publish_auction_results", publish_auction_results), \
+            patch("prozorro_auction.chronograph.outbox.postpone_outbox_job", postpone_outbox_job), \
+            patch("prozorro_auction.chronograph.outbox.add_dead_letter", add_dead_letter), \
+            patch("prozorro_auction.chronograph.outbox.delete_outbox_job", delete_outbox_job), \
+            patch("prozorro_auction.chronograph.outbox.CHRONOGRAPH_OUTBOX_MAX_ATTEMPTS", 3):
+        yield calls
+
+
+@pytest.mark.asyncio
+async def test_failed_job_is_postponed(failing_job_calls):
+    await process_outbox_job({"_id": "a", "attempts": 1})
+    assert failing_job_calls == [("postpone", "a", 2)]
+
+
+@pytest.mark.asyncio
+async def test_failed_job_goes_to_dead_letters(failing_job_calls):
+    await process_outbox_job({"_id": "a", "attempts": 2})
+    assert failing_job_calls == [
+        ("dead_letter", "a", "publication", 3, "ValueError('api error')"),
+        ("delete", "a"),
+    ]
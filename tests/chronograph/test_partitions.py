@@ -0,0 +1,16 @@
+import unittest
+
+from prozorro_auction.chronograph.partitions import assign_buckets
+
+
+class AssignBucketsTestCase(unittest.TestCase):
+
+    def test_buckets_are_split(self):
+        members = ["a", "b", "c"]
+        assigned = [assign_buckets(members, m, buckets_count=8) for m in members]
+        self.assertEqual(assigned, [[0, 3, 6], [1, 4, 7], [2, 5]])
+
+    def test_rebalance(self):
+        self.assertEqual(assign_buckets(["a"], "a", buckets_count=4), [0, 1, 2, 3])
+        self.assertEqual(assign_buckets(["a", "b"], "a", buckets_count=4), [0, 2])
+        self.assertEqual(assign_buckets(["a", "b"], "c", buckets_count=4), None)
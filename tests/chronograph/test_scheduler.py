@@ -0,0 +1,43 @@
+import unittest
+
+from datetime import datetime, timedelta
+
+from prozorro_auction.chronograph.scheduler import TimerScheduler, timer_to_timestamp
+
+
+class TimerSchedulerTestCase(unittest.TestCase):
+
+    def test_next_timestamp(self):
+        scheduler = TimerScheduler()
+        timer = datetime(2019, 8, 12, 11, 53, 52)
+        scheduler.set_timer("a", timer + timedelta(minutes=2))
+        scheduler.set_timer("b", timer + timedelta(minutes=1))
+        self.assertEqual(scheduler.get_next_timestamp(), timer_to_timestamp(timer + timedelta(minutes=1)))
+
+        # "b" has been moved to the future
+        scheduler.set_timer("b", timer + timedelta(minutes=3))
+        self.assertEqual(scheduler.get_next_timestamp(), timer_to_timestamp(timer + timedelta(minutes=2)))
+
+        # "a" has been finished
+        scheduler.set_timer("a", None)
+        self.assertEqual(scheduler.get_next_timestamp(), timer_to_timestamp(timer + timedelta(minutes=3)))
+
+        scheduler.set_timer("b", None)
+        self.assertIsNone(scheduler.get_next_timestamp())
+
+    def test_apply_change(self):
+        scheduler = TimerScheduler()
+        timer = datetime(2019, 8, 12, 11, 53, 52)
+        scheduler._apply_change({
+            "operationType": "insert",
+            "documentKey": {"_id": "a"},
+            "fullDocument": {"timer": timer},
+        })
+        self.assertEqual(scheduler.get_next_timestamp(), timer_to_timestamp(timer))
+
+        scheduler._apply_change({
+            "operationType": "update",
+            "documentKey": {"_id": "a"},
+            "updateDescription": {"updatedFields": {}, "removedFields": ["timer"]},
+        })
+        self.assertIsNone(scheduler.get_next_timestamp())
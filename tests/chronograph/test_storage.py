@@ -0,0 +1,54 @@
+import unittest
+
+from datetime import datetime
+
+from prozorro_auction.chronograph.storage import get_auction_changes, copy_update_fields
+
+
+class AuctionChangesTestCase(unittest.TestCase):
+
+    def test_only_changed_paths(self):
+        auction = {
+            "_id": "a",
+            "title": "Not saved by chronograph",
+            "current_stage": 1,
+            "timer": datetime(2019, 8, 12, 11, 53, 52),
+            "stages": [
+                {"type": "pause", "start": "2019-08-12T14:53:52+03:00"},
+                {"type": "bids", "bidder_id": "b1", "start": "2019-08-12T14:55:52+03:00"},
+            ],
+            "bids": [{"id": "b1", "stages": {"1": {"amount": 10}}}],
+        }
+        original = copy_update_fields(auction)
+        self.assertNotIn("title", original)
+
+        auction["current_stage"] = 2
+        auction["timer"] = datetime(2019, 8, 12, 11, 55, 52)
+        auction["stages"][1]["amount"] = 9
+        auction["stages"][1].pop("bidder_id")
+        auction["bids"][0]["stages"]["1"]["amount"] = 9
+        auction["results"] = [{"bidder_id": "b1"}]
+
+        set_data, unset_data = get_auction_changes(original, copy_update_fields(auction))
+        self.assertEqual(
+            set_data,
+            {
+                "current_stage": 2,
+                "timer": datetime(2019, 8, 12, 11, 55, 52),
+                "stages.1.amount": 9,
+                "bids.0.stages.1.amount": 9,
+                "results": [{"bidder_id": "b1"}],
+            }
+        )
+        self.assertEqual(unset_data, {"stages.1.bidder_id": ""})
+
+    def test_resized_list_and_changed_type(self):
+        original = {"stages": [{"type": "pause"}], "current_stage": 1}
+        data = {"stages": [{"type": "pause"}, {"type": "bids"}], "current_stage": 1.0}
+        set_data, unset_data = get_auction_changes(original, data)
+        self.assertEqual(set_data, data)
+        self.assertEqual(unset_data, {})
+
+    def test_nothing_changed(self):
+        original = {"stages": [{"type": "pause"}], "current_stage": 1}
+        self.assertEqual(get_auction_changes(original, dict(original)), ({}, {}))
@@ -1,19 +1,25 @@
 import unittest
 
 from copy import deepcopy
+from datetime import timedelta
+from decimal import Decimal
 from barbecue import calculate_coeficient, cooking
 
 from prozorro_auction.databridge.model import (
     build_urls_patch,
     get_data_from_tender,
+    get_auctions_from_tender,
 )
 from prozorro_auction.databridge.model import (
     generate_auction_id,
     is_auction_cancelled,
     get_items,
     get_auction_type,
+    get_auction_bucket,
 )
-from prozorro_auction.settings import AUCTION_HOST
+from prozorro_auction.chronograph.model import sort_bids
+from prozorro_auction.settings import AUCTION_HOST, CHRONOGRAPH_BUCKETS
+from prozorro_auction.utils.base import get_now
 
 from tests.base import (
     test_tender_data,
@@ -245,6 +251,24 @@ class GetDataFromTenderTestCase(unittest.TestCase):
         assert tender["procurementMethodType"] == "esco"
         self.assert_auction_default(tender)
 
+    def test_get_data_esco_without_amounts(self):
+        tender = deepcopy(test_tender_data_esco)
+        assert all("amountPerformance" not in bid["value"] for bid in tender["bids"])
+        result = list(get_data_from_tender(tender))[0]
+        self.assertTrue(all("sort_key" not in bid for bid in result["bids"]))
+
+        # the keys are calculated when the bids get their amounts
+        bids = result["bids"]
+        bids[0]["value"]["amountPerformance"] = "200"
+        bids[1]["value"]["amountPerformance"] = "100"
+        self.assertEqual(sort_bids(bids, "default"), [bids[1], bids[0]])
+
+    def test_get_data_default_sort_keys(self):
+        tender = deepcopy(test_tender_data)
+        result = list(get_data_from_tender(tender))[0]
+        for bid in result["bids"]:
+            self.assertEqual(bid["sort_key"], Decimal(str(bid["value"]["amount"])))
+
     def test_get_data_default_multilot(self):
         tender = deepcopy(test_tender_data_multilot)
         self.assert_auction_default_multilot(tender)
@@ -272,6 +296,23 @@ class GetDataFromTenderTestCase(unittest.TestCase):
         self.assert_auction_mixed(tender)
 
 
+class GetAuctionsFromTenderTestCase(unittest.TestCase):
+
+    def test_replanned_auction_publishes_results(self):
+        tender = deepcopy(test_tender_data)
+        tender["auctionPeriod"]["startDate"] = (get_now() + timedelta(hours=1)).isoformat()
+        auction = list(get_auctions_from_tender(tender))[0]
+        self.assertEqual(auction["current_stage"], -1)
+        # the flags of the previous run are overwritten
+        self.assertIs(auction["_audit_document_posted"], False)
+        self.assertIs(auction["_auction_results_sent"], False)
+
+    def test_past_auction_skipped(self):
+        tender = deepcopy(test_tender_data)
+        tender["auctionPeriod"]["startDate"] = (get_now() - timedelta(hours=1)).isoformat()
+        self.assertEqual(list(get_auctions_from_tender(tender)), [])
+
+
 class GenerateLotAuctionIdTestCase(unittest.TestCase):
 
     def test_tender(self):
@@ -307,6 +348,19 @@ class GetAuctionTypeTestCase(unittest.TestCase):
         self.assertEqual(get_auction_type(auction, tender), "mixed")
 
 
+class GetAuctionBucketTestCase(unittest.TestCase):
+
+    def test_stable_bucket(self):
+        auction_id = "1ee3ceb8ab0a4e4e9b5e8fbc0b1ba3d0_2d6db6d5a8f94f6fa5c2e1f36ea0e7fc"
+        bucket = get_auction_bucket(auction_id)
+        self.assertEqual(bucket, get_auction_bucket(auction_id))
+        self.assertIn(bucket, range(CHRONOGRAPH_BUCKETS))
+
+    def test_buckets_spread(self):
+        buckets = {get_auction_bucket(f"{n:032x}") for n in range(1000)}
+        self.assertEqual(len(buckets), CHRONOGRAPH_BUCKETS)
+
+
 class IsAuctionCancelledTestCase(unittest.TestCase):
 
     def test_cancelled_with_cancelled(self):
@@ -0,0 +1,201 @@
+from prozorro_auction.storage import get_mongodb_collection
+from prozorro_auction.chronograph.storage import (
+    claim_expired_timers,
+    increase_and_read_expired_timer,
+    extend_lease,
+    update_auction,
+    add_dead_letter,
+    read_dead_letters,
+    requeue_dead_letter,
+    add_outbox_job,
+    claim_outbox_job,
+    claim_tender_outbox_jobs,
+    DEAD_LETTERS_COLLECTION,
+    OUTBOX_COLLECTION,
+    PUBLICATION_DEAD_LETTER_STAGE,
+)
+from prozorro_auction.utils.base import get_now
+from tests.integration.base import BaseTestCase
+from datetime import timedelta
+from unittest.mock import patch
+
+
+class TestClaimExpiredTimers(BaseTestCase):
+
+    async def tearDownAsync(self):
+        await get_mongodb_collection().delete_many({})
+
+    async def test_claim_batch(self):
+        now = get_now()
+        collection = get_mongodb_collection()
+        await collection.insert_many([
+            {"_id": "1", "timer": now - timedelta(minutes=3)},
+            {"_id": "2", "timer": now - timedelta(minutes=2)},
+            {"_id": "3", "timer": now - timedelta(minutes=1)},
+            {"_id": "4", "timer": now + timedelta(minutes=1)},
+            {"_id": "5"},
+        ])
+
+        auctions = await claim_expired_timers(2)
+        self.assertEqual([a["_id"] for a in auctions], ["1", "2"])
+        self.assertEqual(len({a["lease_owner"] for a in auctions}), 1)
+
+        auctions = await claim_expired_timers(2)
+        self.assertEqual([a["_id"] for a in auctions], ["3"])
+
+        auctions = await claim_expired_timers(2)
+        self.assertEqual(auctions, [])
+
+    async def test_claim_by_priority(self):
+        now = get_now()
+        collection = get_mongodb_collection()
+        await collection.insert_many([
+            {"_id": "1", "timer": now - timedelta(minutes=3), "timer_priority": 2},
+            {"_id": "2", "timer": now - timedelta(minutes=2), "timer_priority": 1},
+            {"_id": "3", "timer": now - timedelta(minutes=1), "timer_priority": 0},
+            {"_id": "4", "timer": now - timedelta(minutes=2), "timer_priority": 0},
+        ])
+
+        auctions = await claim_expired_timers(3)
+        self.assertEqual([a["_id"] for a in auctions], ["4", "3", "2"])
+
+        auction = await increase_and_read_expired_timer()
+        self.assertEqual(auction["_id"], "1")
+
+    async def test_claim_projection(self):
+        now = get_now()
+        collection = get_mongodb_collection()
+        await collection.insert_one({
+            "_id": "1",
+            "timer": now - timedelta(minutes=1),
+            "current_stage": 0,
+            "items": [{"description": "item"}],
+            "features": [],
+            "bids": [{"id": "b1", "date": now, "value": {"amount": 10}, "hash": "h", "parameters": []}],
+        })
+
+        auctions = await claim_expired_timers(2)
+        self.assertEqual(len(auctions), 1)
+        auction = auctions[0]
+        self.assertEqual(auction["current_stage"], 0)
+        self.assertNotIn("items", auction)
+        self.assertNotIn("features", auction)
+        self.assertEqual(set(auction["bids"][0].keys()), {"id", "date", "value"})
+
+    async def test_lease(self):
+        now = get_now()
+        collection = get_mongodb_collection()
+        await collection.insert_one({"_id": "1", "timer": now - timedelta(minutes=1), "current_stage": 0})
+
+        auction = await increase_and_read_expired_timer(lock=60)
+        self.assertEqual(auction["_id"], "1")
+        self.assertEqual(auction["timer"], auction["lease_until"])
+        lease_owner = auction["lease_owner"]
+        self.assertTrue(await extend_lease("1", lease_owner, lock=120))
+
+        # the lease has expired and another worker has claimed the auction
+        await collection.update_one({"_id": "1"}, {"$set": {"timer": now - timedelta(seconds=1)}})
+        stolen = await increase_and_read_expired_timer(lock=60)
+        self.assertNotEqual(stolen["lease_owner"], lease_owner)
+        self.assertFalse(await extend_lease("1", lease_owner))
+
+        result = await update_auction({"_id": "1", "current_stage": 1}, lease_owner=lease_owner)
+        self.assertEqual(result.matched_count, 0)
+
+        result = await update_auction({"_id": "1", "current_stage": 1}, lease_owner=stolen["lease_owner"])
+        self.assertEqual(result.matched_count, 1)
+        auction = await collection.find_one({"_id": "1"})
+        self.assertEqual(auction["current_stage"], 1)
+        self.assertNotIn("lease_owner", auction)
+        self.assertNotIn("lease_until", auction)
+
+
+class TestDeadLetters(BaseTestCase):
+
+    async def tearDownAsync(self):
+        await get_mongodb_collection().delete_many({})
+        await get_mongodb_collection(DEAD_LETTERS_COLLECTION).delete_many({})
+
+    async def test_requeue(self):
+        collection = get_mongodb_collection()
+        auction = {"_id": "1", "current_stage": 2, "chronograph_errors_count": 20}
+        await collection.insert_one(auction)
+        await add_dead_letter(auction, "bids", "KeyError('amount')")
+
+        dead_letters = await read_dead_letters()
+        self.assertEqual(len(dead_letters), 1)
+        self.assertEqual(dead_letters[0]["_id"], "1")
+        self.assertEqual(dead_letters[0]["current_stage"], 2)
+        self.assertEqual(dead_letters[0]["stage"], "bids")
+        self.assertEqual(dead_letters[0]["errors_count"], 20)
+        self.assertEqual(dead_letters[0]["error"], "KeyError('amount')")
+
+        self.assertTrue(await requeue_dead_letter("1"))
+        self.assertFalse(await requeue_dead_letter("1"))
+        self.assertEqual(await read_dead_letters(), [])
+
+        auction = await collection.find_one({"_id": "1"})
+        self.assertIn("timer", auction)
+        self.assertEqual(auction["chronograph_errors_count"], 0)
+
+    async def test_requeue_publication(self):
+        await get_mongodb_collection().insert_one({"_id": "1", "tender_id": "t1", "lot_id": "lot1"})
+        await add_dead_letter(
+            {"_id": "1", "chronograph_errors_count": 20}, PUBLICATION_DEAD_LETTER_STAGE, "ValueError('api error')"
+        )
+
+        self.assertTrue(await requeue_dead_letter("1"))
+        self.assertEqual(await read_dead_letters(), [])
+
+        outbox = get_mongodb_collection(OUTBOX_COLLECTION)
+        job = await outbox.find_one({"_id": "1"})
+        await outbox.delete_many({})
+        self.assertEqual(job["tender_id"], "t1")
+        self.assertEqual(job["lot_id"], "lot1")
+        self.assertEqual(job["attempts"], 0)
+        auction = await get_mongodb_collection().find_one({"_id": "1"})
+        self.assertNotIn("timer", auction)
+
+
+class TestOutbox(BaseTestCase):
+
+    async def tearDownAsync(self):
+        await get_mongodb_collection(OUTBOX_COLLECTION).delete_many({})
+
+    async def test_claim_tender_jobs(self):
+        with patch("prozorro_auction.chronograph.storage.CHRONOGRAPH_OUTBOX_COALESCE_WINDOW", 0):
+            for auction_id, tender_id in (("1", "t1"), ("2", "t1"), ("3", "t2"), ("4", "t1")):
+                await add_outbox_job({"_id": auction_id, "tender_id": tender_id, "lot_id": f"lot{auction_id}"})
+
+        job = await claim_outbox_job(lock=60)
+        self.assertEqual(job["_id"], "1")
+        jobs = await claim_tender_outbox_jobs(job["tender_id"], lock=60)
+        self.assertEqual([j["_id"] for j in jobs], ["2", "4"])
+
+        self.assertEqual(await claim_tender_outbox_jobs("t1", lock=60), [])
+        job = await claim_outbox_job(lock=60)
+        self.assertEqual(job["_id"], "3")
+
+    async def test_claim_tender_jobs_added_later(self):
+        with patch("prozorro_auction.chronograph.storage.CHRONOGRAPH_OUTBOX_COALESCE_WINDOW", 0):
+            await add_outbox_job({"_id": "1", "tender_id": "t1", "lot_id": "lot1"})
+        # the next lots have finished after the first one, so their jobs aren't due yet
+        await add_outbox_job({"_id": "2", "tender_id": "t1", "lot_id": "lot2"})
+        await add_outbox_job({"_id": "3", "tender_id": "t1", "lot_id": "lot3"})
+        await get_mongodb_collection(OUTBOX_COLLECTION).update_one(
+            {"_id": "3"}, {"$set": {"attempts": 1}}  # a failed job waits for its retry
+        )
+
+        job = await claim_outbox_job(lock=60)
+        self.assertEqual(job["_id"], "1")
+        jobs = await claim_tender_outbox_jobs(job["tender_id"], lock=60)
+        self.assertEqual([j["_id"] for j in jobs], ["2"])
+        self.assertEqual(await claim_tender_outbox_jobs("t1", lock=60), [])
+
+    async def test_lot_jobs_wait_for_coalescing(self):
+        await add_outbox_job({"_id": "1", "tender_id": "t1", "lot_id": "lot1"})
+        await add_outbox_job({"_id": "2", "tender_id": "t2", "lot_id": None})
+
+        job = await claim_outbox_job(lock=60)
+        self.assertEqual(job["_id"], "2")
+        self.assertIsNone(await claim_outbox_job(lock=60))
@@ -1,4 +1,5 @@
 from prozorro_auction.storage import get_mongodb_collection
+from prozorro_auction.api.storage import update_auction_bid_stage
 from tests.integration.base import BaseTestCase
 from decimal import Decimal
 
@@ -28,3 +29,29 @@ class TestProfileActions(BaseTestCase):
         self.assertIsInstance(result["long"], int)
         self.assertEqual(result["long"],  9223372036854775807)
 
+
+class TestUpdateAuctionBidStage(BaseTestCase):
+
+    async def tearDownAsync(self):
+        await get_mongodb_collection().delete_many({})
+
+    async def test_bid_is_saved_at_its_stage_only(self):
+        collection = get_mongodb_collection()
+        await collection.insert_one({
+            "_id": "1",
+            "current_stage": 1,
+            "stages": [{"type": "pause"}, {"type": "bids", "bidder_id": "b2"}],
+            "bids": [{"id": "b1", "hash": "h1"}, {"id": "b2", "hash": "h2"}],
+            "items": [{"description": "item"}],
+        })
+
+        result = await update_auction_bid_stage("1", "b2", 0, {"amount": 10})
+        self.assertIsNone(result)
+        result = await update_auction_bid_stage("1", "b1", 1, {"amount": 10})
+        self.assertIsNone(result)
+
+        result = await update_auction_bid_stage("1", "b2", 1, {"amount": 10})
+        self.assertEqual(result, {"_id": "1", "bids": [{"id": "b2", "hash": "h2", "stages": {"1": {"amount": 10}}}]})
+
+        result = await update_auction_bid_stage("1", "b2", 1, "")
+        self.assertEqual(result, {"_id": "1", "bids": [{"id": "b2", "hash": "h2", "stages": {}}]})
@@ -2,7 +2,9 @@ import unittest
 
 from unittest.mock import patch
 
-from prozorro_auction.utils.base import get_now
+from prozorro_auction.utils.base import get_now, get_backoff_delay
+from prozorro_auction.utils.ranking import calculate_bid_sort_key
+from decimal import Decimal
 from prozorro_auction.settings import TZ
 
 
@@ -17,3 +19,30 @@ class UtilsCase(unittest.TestCase):
 
         now_mock.now.assert_called_once_with(tz=TZ)
         assert result == now
+
+    def test_get_backoff_delay(self):
+        for attempt, expected in ((1, 2), (2, 4), (3, 8), (10, 60), (10000, 60)):
+            delay = get_backoff_delay(attempt, base=2, max_delay=60)
+            assert expected / 2 <= delay <= expected
+
+    def test_calculate_bid_sort_key(self):
+        bid = {
+            "value": {"amount": 100.5},
+            "amount_features": "201/2",
+            "amount_weighted": 120.25,
+            "denominator": 0.9,
+            "addition": 10,
+        }
+        self.assertEqual(calculate_bid_sort_key(bid, "default"), Decimal("100.5"))
+        self.assertEqual(calculate_bid_sort_key(bid, "meat"), Decimal("100.5"))
+        self.assertEqual(calculate_bid_sort_key(bid, "lcc"), Decimal("120.25"))
+        # mixed auctions are ranked by the bid amounts
+        self.assertEqual(calculate_bid_sort_key(bid, "mixed"), Decimal("100.5"))
+
+        esco_bid = {"value": {"amountPerformance": "1/3"}}
+        self.assertEqual(
+            calculate_bid_sort_key(esco_bid, "default"),
+            Decimal("0.3333333333333333333333333333333333")
+        )
+        with self.assertRaises(NotImplementedError):
+            calculate_bid_sort_key(esco_bid, "lcc")